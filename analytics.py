@@ -0,0 +1,257 @@
+import argparse
+import heapq
+import threading
+import time
+from datetime import datetime
+
+import profiling
+import scoring
+import storage
+from question_model import MISSING_QUESTION
+from question_store import UNCATEGORIZED, record_questions
+
+# Running per-question and per-category performance aggregates over the exam
+# history, persisted as described on HistoryFold.
+#
+#   python analytics.py --rebuild    # recompute everything from the history
+
+ANALYTICS_FILE = "local_analytics.jsonl"
+COMPACT_RATIO = 2  # saved lines per question that trigger a rewrite on load
+
+_RECORD_ID_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def record_time(record):
+    # Records are stamped through their ID; None for IDs that are not dates.
+    try:
+        return datetime.strptime(str(record.get('id', ''))[:15], _RECORD_ID_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def iter_attempts(record, store):
+    # (question, verdict, guessed) for every question of a history record
+    questions = record_questions(record, store)
+    result = scoring.record_result(record, questions)
+    guesses = record.get('guesses', {})
+    for i, q in enumerate(questions):
+        if q is not MISSING_QUESTION:
+            yield q, result.verdict(i), bool(guesses.get(str(i), guesses.get(i)))
+
+
+class Stats:
+    __slots__ = ('attempts', 'correct', 'wrong', 'guessed', 'guessed_correct', 'last_seen', 'last_verdict')
+
+    def __init__(self, attempts=0, correct=0, wrong=0, guessed=0, guessed_correct=0, last_seen=None, last_verdict=None):
+        self.attempts = attempts
+        self.correct = correct
+        self.wrong = wrong
+        self.guessed = guessed
+        self.guessed_correct = guessed_correct
+        self.last_seen = last_seen
+        self.last_verdict = last_verdict
+
+    @property
+    def skipped(self):
+        return self.attempts - self.correct - self.wrong
+
+    @property
+    def accuracy(self):
+        # Of the attempts that were answered
+        answered = self.correct + self.wrong
+        return self.correct / answered if answered else None
+
+    @property
+    def guess_accuracy(self):
+        return self.guessed_correct / self.guessed if self.guessed else None
+
+    @property
+    def sure_accuracy(self):
+        # Answered without the guess flag; compare with guess_accuracy for calibration
+        answered = self.correct + self.wrong - self.guessed
+        return (self.correct - self.guessed_correct) / answered if answered > 0 else None
+
+    def add(self, verdict, guessed, seen_at):
+        self.attempts += 1
+        if verdict == scoring.CORRECT:
+            self.correct += 1
+        elif verdict == scoring.WRONG:
+            self.wrong += 1
+        if guessed and verdict != scoring.SKIPPED:
+            self.guessed += 1
+            if verdict == scoring.CORRECT:
+                self.guessed_correct += 1
+        if seen_at is not None and (self.last_seen is None or seen_at >= self.last_seen):
+            self.last_seen = seen_at
+        self.last_verdict = verdict
+
+    def merge(self, other):
+        self.attempts += other.attempts
+        self.correct += other.correct
+        self.wrong += other.wrong
+        self.guessed += other.guessed
+        self.guessed_correct += other.guessed_correct
+        if other.last_seen is not None and (self.last_seen is None or other.last_seen > self.last_seen):
+            self.last_seen = other.last_seen
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{f: d[f] for f in cls.__slots__ if f in d})
+
+
+class HistoryFold:
+    # Base of the per-question aggregates kept current from the exam history
+    # (Analytics here, the review schedule in scheduler.py). Every submitted
+    # record is folded in once; the file only ever gets the new state of the
+    # questions in that record appended (later lines for the same ID win on
+    # load), followed by a marker with the number of history records folded
+    # so far. Anything in the history past that marker, e.g. after a crash, is
+    # folded in on the next sync. Subclasses implement _fold(record, changed)
+    # and _entries() (question ID -> object with to_dict()).
+    # Shared by every session; all updates go through sync(), under a lock.
+
+    def __init__(self, store, filepath):
+        self.filepath = filepath
+        self.records = 0  # history records folded in
+        self._store = store
+        self._lock = threading.Lock()
+
+    def _load(self, load, from_dict):
+        # The saved state (question ID -> from_dict(line)); sets self.records from
+        # the marker. A file grown past COMPACT_RATIO lines per question is rewritten
+        # with one, so neither it nor startup keeps growing with every submit.
+        entries, lines = {}, 0
+        for raw in storage.iter_jsonl(self.filepath) if load else ():
+            lines += 1
+            if 'records' in raw:
+                self.records = raw['records']
+            elif 'id' in raw:
+                entries[raw['id']] = from_dict(raw)
+        if lines > COMPACT_RATIO * (len(entries) + 1):
+            self._rewrite(entries)
+        return entries
+
+    def _lines(self, entries):
+        for qid, entry in entries.items():
+            yield dict(id=qid, **entry.to_dict())
+        yield {"records": self.records}
+
+    def sync(self, history):
+        # Folds in the history records added since the last sync and appends
+        # their questions' new state. history is a HistoryStore.
+        with profiling.span(f"{type(self).__name__}.sync"), self._lock:
+            new_records = history.records_since(self.records)
+            if not new_records:
+                return 0
+            changed = {}
+            for record in new_records:
+                self._fold(record, changed)
+            self.records += len(new_records)
+            storage.append_jsonl(self._lines(changed), self.filepath)
+            return len(new_records)
+
+    def compact(self):
+        # Rewrites the file with one line per question.
+        with self._lock:
+            self._rewrite(self._entries())
+
+    def _rewrite(self, entries):
+        storage.atomic_write_lines((storage.dumps(line) for line in self._lines(entries)), self.filepath)
+
+    def rebuild(self, history):
+        # Folds in the whole history from scratch; also compacts the file.
+        with self._lock:
+            records = history.records_since(0)
+            changed = {}
+            for record in records:
+                self._fold(record, changed)
+            self.records = len(records)
+            self._rewrite(self._entries())
+        return self
+
+
+class Analytics(HistoryFold):
+    def __init__(self, store, filepath=ANALYTICS_FILE, load=True):
+        super().__init__(store, filepath)
+        self._questions = self._load(load, Stats.from_dict)
+        self._categories = {}
+        for qid, stats in self._questions.items():
+            self._category_stats(store.get(qid)).merge(stats)
+
+    def __len__(self):
+        return len(self._questions)
+
+    def __contains__(self, qid):
+        return qid in self._questions
+
+    def _category_stats(self, q):
+        category = q.category or UNCATEGORIZED
+        stats = self._categories.get(category)
+        if stats is None:
+            stats = self._categories[category] = Stats()
+        return stats
+
+    def still_wrong(self, qid):
+        # The most recent attempt at the question was answered wrong
+        stats = self._questions.get(qid)
+        return stats is not None and stats.last_verdict == scoring.WRONG
+
+    def categories(self):
+        return dict(self._categories)
+
+    def most_missed(self, n=10):
+        # (question ID, stats) with the most wrong answers
+        return heapq.nlargest(n, ((qid, s) for qid, s in self._questions.items() if s.wrong),
+                              key=lambda item: (item[1].wrong, -(item[1].accuracy or 0)))
+
+    def _fold(self, record, changed):
+        seen_at = record_time(record)
+        for q, verdict, guessed in iter_attempts(record, self._store):
+            stats = self._questions.get(q.id)
+            if stats is None:
+                stats = self._questions[q.id] = Stats()
+            stats.add(verdict, guessed, seen_at)
+            self._category_stats(q).add(verdict, guessed, seen_at)
+            changed[q.id] = stats
+
+    def _entries(self):
+        return self._questions
+
+
+def rebuild(store, history, filepath=ANALYTICS_FILE):
+    # Recomputes everything from the history; also compacts the file.
+    return Analytics(store, filepath, load=False).rebuild(history)
+
+
+def format_age(timestamp, now=None):
+    if timestamp is None:
+        return "-"
+    seconds = max(0, (now or time.time()) - timestamp)
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+    return "just now"
+
+
+if __name__ == "__main__":
+    import history_store
+    import question_store
+
+    parser = argparse.ArgumentParser(description="Per-question performance analytics")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the aggregates from the exam history")
+    args = parser.parse_args()
+    store = question_store.QuestionStore()
+    history = history_store.HistoryStore()
+    if args.rebuild:
+        analytics = rebuild(store, history)
+    else:
+        analytics = Analytics(store)
+        analytics.sync(history)
+    print(f"{analytics.records} exams, {len(analytics)} questions attempted")
+    for category, stats in sorted(analytics.categories().items()):
+        accuracy = f"{stats.accuracy:.0%}" if stats.accuracy is not None else "-"
+        print(f"  {category}: {stats.attempts} attempts, {accuracy} correct, last seen {format_age(stats.last_seen)}")
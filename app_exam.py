@@ -1,276 +1,353 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import csv
 import json
-import os
-import requests
-import PyPDF2
-import re
+from collections import deque
 from datetime import datetime
+import history_store
+import question_store
+import question_model
+import scoring
+import exam_session
+import exam_journal
+import exam_builder
+import analytics
+import scheduler
+import gemini_client
+import generation
+import pdf_pipeline
+import profiling
+import bulk_io
 
 # --- PAGE CONFIG ---
 st.set_page_config(layout="wide", page_title="INI SS CBT Simulator", initial_sidebar_state="collapsed")
 
-QBANK_FILE = "local_qbank.json"
-HISTORY_FILE = "local_history.json"
+# Opt-in timings for this rerun (EXAM_PROFILE=1), shown in the sidebar; None otherwise
+PROFILE_RUN = profiling.begin_run(st.session_state.get('profile_since'))
 
-# --- 1. DATA MANAGEMENT FUNCTIONS ---
-def load_json(filepath):
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return []
-    return []
+QBANK_FILE = question_store.QUESTIONS_FILE
+HISTORY_FILE = history_store.HISTORY_FILE
 
-def save_json(data, filepath):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+# --- 1. DATA MANAGEMENT FUNCTIONS ---
+# The bank and the history are loaded once per server process and shared by every
+# browser session; a session only keeps the IDs of the questions it is working on.
+@st.cache_resource(show_spinner="Loading question bank...")
+def get_qbank():
+    return question_store.QuestionStore(QBANK_FILE)
+
+@st.cache_resource(show_spinner="Loading exam history...")
+def get_history():
+    return history_store.HistoryStore(HISTORY_FILE)
+
+@st.cache_resource(show_spinner="Updating performance stats...")
+def get_analytics():
+    # Running per-question/category aggregates; sync() folds in history it has not seen yet
+    stats = analytics.Analytics(get_qbank())
+    stats.sync(get_history())
+    return stats
+
+@st.cache_resource(show_spinner="Updating review schedule...")
+def get_scheduler():
+    # Spaced-repetition due dates; synced with the history like the analytics
+    schedule = scheduler.Scheduler(get_qbank())
+    schedule.sync(get_history())
+    return schedule
+
+@st.cache_resource
+def get_journal():
+    # Autosave of exams in progress, for resume after a refresh or restart
+    return exam_journal.ExamJournal()
+
+def active_question(idx):
+    return get_qbank().get(st.session_state.active_ids[idx])
+
+def active_questions():
+    return get_qbank().resolve(st.session_state.active_ids)
+
+@profiling.traced()
+def add_to_qbank(raw_questions, category=None):
+    # Normalizes raw dicts into Question objects, interns them (duplicates are merged into
+    # the stored copy) and returns the stored copies, each once and in order
+    questions, errors = question_model.parse_questions(raw_questions)
+    if errors:
+        st.toast(f"Skipped {len(errors)} malformed questions (e.g. #{errors[0][0] + 1}: {errors[0][1]}).")
+    if category:
+        questions = [q if q.category else q.replace(category=category) for q in questions]
+    qbank = get_qbank()
+    before = len(qbank)
+    stored = list(dict.fromkeys(qbank.add_many(questions))) # A question repeated in the batch is one exam item
+    added = len(qbank) - before
+    if added < len(stored):
+        st.toast(f"Added {added} new questions to your bank ({len(stored) - added} were already saved).")
+    return stored
 
 # --- 2. SESSION STATE INITIALIZATION ---
-if 'qbank' not in st.session_state:
-    st.session_state.qbank = load_json(QBANK_FILE)
-if 'history' not in st.session_state:
-    st.session_state.history = load_json(HISTORY_FILE)
-    
 # modes: 'dashboard', 'exam', 'review'
 if 'mode' not in st.session_state:
     st.session_state.mode = 'dashboard'
     
-if 'active_questions' not in st.session_state:
-    st.session_state.active_questions = []
+if 'active_ids' not in st.session_state:
+    st.session_state.active_ids = [] # Question IDs in the shared bank, in exam order
 if 'current_q_idx' not in st.session_state:
     st.session_state.current_q_idx = 0
-if 'responses' not in st.session_state:
-    st.session_state.responses = {}
-if 'statuses' not in st.session_state:
-    st.session_state.statuses = {} 
-if 'guesses' not in st.session_state:
-    st.session_state.guesses = {}
+if 'seconds_per_q' not in st.session_state:
+    st.session_state.seconds_per_q = 0 # 0 = untimed
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
+if 'palette_page' not in st.session_state:
+    st.session_state.palette_page = None # None = follow the current question
+if 'gen_job' not in st.session_state:
+    st.session_state.gen_job = None # Batches still being generated for the running exam
+if 'exam_id' not in st.session_state:
+    st.session_state.exam_id = None # Journal key of the exam in progress
+if 'exam' not in st.session_state:
+    st.session_state.exam = None # ExamSession for the active exam or review
+if 'result' not in st.session_state:
+    st.session_state.result = None
+if 'profile_runs' not in st.session_state:
+    st.session_state.profile_runs = deque(maxlen=50) # Last reruns recorded by the profiler
 
 # --- 3. AI GENERATION LOGIC (Dynamic Model Fetching) ---
-def extract_text_from_pdf(pdf_file):
-    reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-def generate_questions_from_ai(api_key, topic, pdf_text="", num_q=10):
-    clean_key = api_key.strip()
-    
-    # STEP 1: Dynamically ask Google which models this specific API key has access to
-    list_url = f"https://generativelanguage.googleapis.com/v1beta/models?key={clean_key}"
-    
-    try:
-        list_resp = requests.get(list_url)
-        if list_resp.status_code == 400:
-            st.error("Your API Key is invalid. Please check it and try again.")
-            return None
-            
-        list_resp.raise_for_status()
-        available_models = list_resp.json().get('models', [])
-        
-        # Filter for models that actually support text generation
-        valid_models = [
-            m['name'].replace('models/', '') 
-            for m in available_models 
-            if 'generateContent' in m.get('supportedGenerationMethods', [])
-        ]
-        
-        if not valid_models:
-            st.error("Your API key does not have access to any text generation models in your region.")
-            return None
-            
-        # Pick the best available model (prioritizing the newest flash/pro models)
-        chosen_model = valid_models[0] # Fallback to whatever is first
-        preferences = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
-        
-        for pref in preferences:
-            found = False
-            for vm in valid_models:
-                if pref in vm:
-                    chosen_model = vm
-                    found = True
-                    break
-            if found:
-                break
-                
-    except Exception as e:
-        st.error(f"Failed to authenticate or fetch allowed models. Error: {e}")
-        return None
-
-    # STEP 2: Use the exact model the API just told us is valid
-    prompt = f"""
-    You are an expert medical examiner for the INI SS (super-specialty) exam.
-    Create {num_q} multiple-choice questions on the topic: "{topic}".
-    If context text is provided below, base the questions on that text.
-    
-    Context Text: {pdf_text[:15000]}
-    
-    CRITICAL INSTRUCTION: Your response MUST be ONLY a valid JSON array. Do not include any markdown formatting or extra text.
-    Format exactly like this:
-    [
-      {{
-        "question": "Question text here?",
-        "options": ["Option A", "Option B", "Option C", "Option D"],
-        "correct_answer": "Option B",
-        "rationale": "Explanation here."
-      }}
-    ]
-    """
-    
-    headers = {'Content-Type': 'application/json'}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.7}
-    }
-    
-    generate_url = f"https://generativelanguage.googleapis.com/v1beta/models/{chosen_model}:generateContent?key={clean_key}"
-    
-    try:
-        response = requests.post(generate_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        if 'candidates' not in result or not result['candidates']:
-            st.error("The AI returned an empty response. Please try again.")
-            return None
-            
-        raw_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
-        
-        # Smart cleanup using regex to find the JSON array
-        match = re.search(r'\[.*\]', raw_text, re.DOTALL)
-        if match:
-            raw_text = match.group(0)
-            
-        return json.loads(raw_text)
-        
-    except requests.exceptions.HTTPError as err:
-        st.error(f"Failed to generate questions. The model '{chosen_model}' rejected the request.")
+def show_generation_error(err):
+    st.error(err.message)
+    if err.detail:
         with st.expander("Click to view detailed API error"):
-            st.code(response.text)
-        return None
-    except json.JSONDecodeError:
-        st.error("The AI returned improperly formatted data. Please try generating again.")
-        return None
-    except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        return None
+            st.code(err.detail)
+
+@profiling.traced()
+def start_generated_exam(api_key, topic, num_q, category, plan=None):
+    # Batches are generated in parallel; the exam starts as soon as the first one
+    # lands and the rest are appended while the user is already answering.
+    job = generation.GenerationJob(api_key.strip(), topic, num_q, plan, is_known=get_qbank().is_known)
+    if job.total_batches == 0:
+        st.error("No text could be extracted from this document (is it a scanned image?).")
+        return False
+    first = job.wait_first()
+    if not first and job.dropped and not job.errors:
+        job.cancel()
+        st.warning(f"All {job.dropped} generated questions are already in your bank. Try a different or narrower topic.")
+        return False
+    if not first:
+        job.cancel()
+        show_generation_error(job.errors[0] if job.errors else gemini_client.GeminiError("The AI returned an empty response. Please try again."))
+        return False
+    start_exam(add_to_qbank(first, category=category))
+    if not job.done:
+        st.session_state.gen_job = job
+        st.session_state.gen_category = category
+    return True
 
 # --- 4. NAVIGATION & EXAM LOGIC ---
+@profiling.traced()
 def start_exam(questions):
     if not questions: return
-    st.session_state.active_questions = questions
+    cancel_generation()
+    exam_session.clear_widget_keys(st.session_state)
+    st.session_state.active_ids = [q.id for q in questions]
     st.session_state.mode = 'exam'
     st.session_state.current_q_idx = 0
-    st.session_state.responses = {}
-    st.session_state.guesses = {i: False for i in range(len(questions))}
-    st.session_state.statuses = {i: 0 for i in range(len(questions))}
-    st.session_state.statuses[0] = 2 # First question visited
-
+    st.session_state.palette_page = None
+    st.session_state.exam = exam_session.ExamSession(len(questions), st.session_state.seconds_per_q)
+    st.session_state.exam.visit(0) # First question visited
+    st.session_state.exam.enter(0)
+    st.session_state.exam_id = exam_journal.new_exam_id()
+    get_journal().start(st.session_state.exam_id, st.session_state.active_ids, st.session_state.exam)
+
+@profiling.traced()
+def resume_exam(exam_id):
+    replayed = get_journal().replay(exam_id)
+    if replayed is None: return
+    ids, exam, current = replayed
+    cancel_generation()
+    exam_session.clear_widget_keys(st.session_state)
+    st.session_state.active_ids = ids
+    st.session_state.exam = exam
+    st.session_state.exam_id = exam_id
+    st.session_state.mode = 'exam'
+    st.session_state.current_q_idx = current
+    st.session_state.palette_page = None
+    exam.visit(current)
+    exam.enter(current)
+
+@profiling.traced()
+def discard_exam(exam_id):
+    get_journal().finish(exam_id)
+
+def journal_answer(idx):
+    # One small delta per answer; the next question index is where a resume picks up
+    get_journal().record(st.session_state.exam_id, idx, st.session_state.exam, st.session_state.current_q_idx)
+
+@profiling.traced()
+def cancel_generation():
+    if st.session_state.gen_job is not None:
+        st.session_state.gen_job.cancel()
+        st.session_state.gen_job = None
+
+@profiling.traced()
+def append_generated_questions():
+    # Moves finished batches into the running exam; returns True if it grew.
+    job = st.session_state.gen_job
+    if job is None or st.session_state.mode != 'exam':
+        return False
+    new_qs = job.poll()
+    if job.done:
+        st.session_state.gen_job = None
+        if job.errors:
+            st.toast(f"{len(job.errors)} of {job.total_batches} question batches failed: {job.errors[0].message}")
+    if not new_qs:
+        return False
+    active_ids = set(st.session_state.active_ids)
+    added = [q.id for q in add_to_qbank(new_qs, category=st.session_state.gen_category) if q.id not in active_ids]
+    if not added:
+        return False
+    st.session_state.active_ids.extend(added)
+    st.session_state.exam.extend(len(added))
+    get_journal().extend(st.session_state.exam_id, added)
+    return True
+
+@profiling.traced()
 def go_to_dashboard():
+    cancel_generation()
+    exam_session.clear_widget_keys(st.session_state)
     st.session_state.mode = 'dashboard'
-    st.session_state.active_questions = []
+    st.session_state.active_ids = []
+    st.session_state.exam = None
+    st.session_state.result = None
 
 def get_current_selection():
-    key = f"radio_{st.session_state.current_q_idx}"
-    return st.session_state.get(key, st.session_state.responses.get(st.session_state.current_q_idx, None))
+    idx = st.session_state.current_q_idx
+    return st.session_state.get(f"radio_{idx}", st.session_state.exam.response(idx))
+
+def enter_question(idx):
+    # Dwell time goes to the question being left; O(1) per navigation
+    if st.session_state.mode == 'exam':
+        st.session_state.exam.enter(idx)
 
+@profiling.traced()
 def move_to_next():
-    total_q = len(st.session_state.active_questions)
+    st.session_state.palette_page = None
+    total_q = len(st.session_state.active_ids)
     if st.session_state.current_q_idx < total_q - 1:
         st.session_state.current_q_idx += 1
-        if st.session_state.statuses[st.session_state.current_q_idx] == 0:
-            st.session_state.statuses[st.session_state.current_q_idx] = 2
+        st.session_state.exam.visit(st.session_state.current_q_idx)
+        enter_question(st.session_state.current_q_idx)
 
+@profiling.traced()
 def move_to_prev():
+    st.session_state.palette_page = None
     if st.session_state.current_q_idx > 0:
         st.session_state.current_q_idx -= 1
+        enter_question(st.session_state.current_q_idx)
+
+@profiling.traced()
+def review_next():
+    move_to_next()
+    rerun_panes()
+
+@profiling.traced()
+def review_prev():
+    move_to_prev()
+    rerun_panes()
 
+@profiling.traced()
 def save_and_next():
+    if st.session_state.exam.expired(): return # Answers are frozen at the deadline
     idx = st.session_state.current_q_idx
     ans = get_current_selection()
-    if ans:
-        st.session_state.responses[idx] = ans
-        st.session_state.statuses[idx] = 1 # Answered
-    else:
-        st.session_state.responses.pop(idx, None)
-        st.session_state.statuses[idx] = 2 # Not Answered
+    st.session_state.exam.set_response(idx, ans)
+    st.session_state.exam.set_status(idx, exam_session.ANSWERED if ans is not None else exam_session.NOT_ANSWERED)
     move_to_next()
+    journal_answer(idx)
+    rerun_panes()
 
+@profiling.traced()
 def mark_and_next():
+    if st.session_state.exam.expired(): return
     idx = st.session_state.current_q_idx
     ans = get_current_selection()
-    if ans:
-        st.session_state.responses[idx] = ans
-        st.session_state.statuses[idx] = 4 # Answered & Marked
-    else:
-        st.session_state.responses.pop(idx, None)
-        st.session_state.statuses[idx] = 3 # Marked
+    st.session_state.exam.set_response(idx, ans)
+    st.session_state.exam.set_status(idx, exam_session.ANSWERED_MARKED if ans is not None else exam_session.MARKED)
     move_to_next()
+    journal_answer(idx)
+    rerun_panes()
 
+@profiling.traced()
 def clear_response():
+    if st.session_state.exam.expired(): return
     idx = st.session_state.current_q_idx
-    st.session_state.responses.pop(idx, None)
+    st.session_state.exam.set_response(idx, None)
     if f"radio_{idx}" in st.session_state:
         st.session_state[f"radio_{idx}"] = None
-    st.session_state.guesses[idx] = False
+    st.session_state.exam.set_guess(idx, False)
     if f"guess_cb_{idx}" in st.session_state:
         st.session_state[f"guess_cb_{idx}"] = False
-    st.session_state.statuses[idx] = 2 
+    st.session_state.exam.set_status(idx, exam_session.NOT_ANSWERED)
+    journal_answer(idx)
+    rerun_panes()
 
+@profiling.traced()
 def jump_to_question(idx):
     if st.session_state.mode == 'exam':
-        curr = st.session_state.current_q_idx
-        if st.session_state.statuses[curr] == 0:
-            st.session_state.statuses[curr] = 2
-        if st.session_state.statuses[idx] == 0:
-            st.session_state.statuses[idx] = 2
+        st.session_state.exam.visit(st.session_state.current_q_idx)
+        st.session_state.exam.visit(idx)
+    enter_question(idx)
     st.session_state.current_q_idx = idx
+    st.session_state.palette_page = None
+    rerun_panes()
 
-def get_correct_answer(q):
-    correct = q.get('correct_answer')
-    if not correct and 'answerOptions' in q:
-        for opt in q.get('answerOptions', []):
-            if opt.get('isCorrect'): return opt.get('text')
-    return correct
-
+@profiling.traced()
 def submit_exam():
-    score = 0
-    total = len(st.session_state.active_questions)
-    for i, q in enumerate(st.session_state.active_questions):
-        if st.session_state.responses.get(i) == get_correct_answer(q):
-            score += 1
+    cancel_generation() # Batches still in flight are not part of this attempt
+    exam = st.session_state.exam
+    exam.enter(None) # Stop the dwell clock
+    # Grade once; review reruns and the palette reuse this result
+    result = scoring.score_exam(active_questions(), exam)
+    st.session_state.result = result
             
     exam_record = {
         "id": datetime.now().strftime("%Y%m%d_%H%M%S"),
         "date": datetime.now().strftime("%b %d, %Y - %I:%M %p"),
-        "score": score,
-        "total": total,
-        "questions": st.session_state.active_questions,
-        "responses": st.session_state.responses,
-        "guesses": st.session_state.guesses
+        "score": result.correct,
+        "total": result.total,
+        "question_ids": list(st.session_state.active_ids), # Already interned in the shared bank
+        "responses": exam.responses_dict(),
+        "guesses": exam.guesses_dict(),
+        "dwell": exam.dwell_list(), # Seconds spent on each question
+        "result": result.to_dict()
     }
+    if exam.deadline is not None:
+        exam_record["time_limit"] = exam.seconds_per_q * len(exam)
     
-    st.session_state.history.insert(0, exam_record) # Add to top of history
-    save_json(st.session_state.history, HISTORY_FILE)
+    get_history().append(exam_record) # Append-only, no full rewrite
+    get_analytics().sync(get_history()) # Folds in just this record
+    get_scheduler().sync(get_history())
+    get_journal().finish(st.session_state.exam_id) # Nothing left to resume
+    st.session_state.exam_id = None
     
+    exam_session.clear_widget_keys(st.session_state)
     st.session_state.mode = 'review'
     st.session_state.current_q_idx = 0
+    st.session_state.palette_page = None
 
+@profiling.traced()
 def load_past_exam(record, is_retake=False):
-    st.session_state.active_questions = record['questions']
+    questions = question_store.record_questions(record, get_qbank())
+    st.session_state.active_ids = [q.id for q in questions]
     st.session_state.current_q_idx = 0
+    st.session_state.palette_page = None
     if is_retake:
-        start_exam(record['questions'])
+        start_exam(questions)
     else:
-        st.session_state.responses = record.get('responses', {})
-        st.session_state.guesses = record.get('guesses', {})
+        exam_session.clear_widget_keys(st.session_state)
+        exam = exam_session.ExamSession.from_history(record, questions)
+        st.session_state.exam = exam
+        st.session_state.result = scoring.record_result(record, questions, exam)
         st.session_state.mode = 'review'
 
 
 # --- 5. CSS STYLING ---
-st.markdown("""
+with profiling.span("css"):
+    st.markdown("""
 <style>
     /* Hide Streamlit components for app-like feel */
     #MainMenu {visibility: hidden;}
@@ -296,10 +373,22 @@ st.markdown("""
     .opt-neutral { background-color: #f5f5f5; border: 1px solid #ddd; padding: 10px; border-radius: 5px; margin-bottom: 8px;}
     .rationale-box { background-color: #e3f2fd; border-left: 5px solid #2196f3; padding: 15px; margin-top: 20px; border-radius: 4px;}
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
 
 # --- 6. DASHBOARD VIEW ---
+HISTORY_PAGE_SIZE = 10
+
+@profiling.traced()
+def set_history_page(page):
+    st.session_state.history_page = page
+
+@profiling.traced()
+def open_past_exam(pos, is_retake):
+    # Only the clicked record is read from disk
+    load_past_exam(get_history().load(pos), is_retake)
+
+@profiling.traced()
 def render_dashboard():
     st.title("🩺 INI SS Generator & Grand Test Simulator")
     
@@ -307,7 +396,23 @@ def render_dashboard():
         api_key = st.text_input("API Key", type="password", placeholder="Paste your API key here...", label_visibility="collapsed")
         st.markdown("Don't have one? [Get your free API Key here](https://aistudio.google.com/app/apikey)")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["🧠 Generate New Exam", "📄 From PDF", "📥 Import JSON", "📊 Past Exams & Grand Tests"])
+    # Timer settings apply to every exam started from the dashboard (including retakes)
+    timer_c1, timer_c2 = st.columns([1, 3])
+    timed = timer_c1.toggle("⏱️ Timed mode", value=st.session_state.seconds_per_q > 0)
+    if timed:
+        st.session_state.seconds_per_q = timer_c2.number_input("Seconds per question", 10, 600, st.session_state.seconds_per_q or 60, step=5)
+    else:
+        st.session_state.seconds_per_q = 0
+    
+    for exam_id, started, total, answered in get_journal().open_exams():
+        with st.container(border=True):
+            cols = st.columns([4, 2, 2])
+            started_str = datetime.fromtimestamp(started).strftime("%b %d, %Y - %I:%M %p") if started else "earlier"
+            cols[0].markdown(f"**Unfinished exam** started {started_str}<br>{answered} of {total} questions answered", unsafe_allow_html=True)
+            cols[1].button("▶️ Resume Exam", key=f"resume_{exam_id}", on_click=resume_exam, args=(exam_id,), type="primary", use_container_width=True)
+            cols[2].button("🗑️ Discard", key=f"discard_{exam_id}", on_click=discard_exam, args=(exam_id,), use_container_width=True)
+    
+    tab1, tab2, tab3, tab_search, tab4 = st.tabs(["🧠 Generate New Exam", "📄 From PDF", "📥 Import / Export", "🔎 Search Bank", "📊 Past Exams & Grand Tests"])
     
     with tab1:
         st.subheader("Generate Exam by Topic")
@@ -318,11 +423,7 @@ def render_dashboard():
             elif not topic: st.error("Please enter a topic!")
             else:
                 with st.spinner("AI is dynamically finding approved models and generating your exam. Please wait..."):
-                    qs = generate_questions_from_ai(api_key, topic, num_q=num_q)
-                    if qs: 
-                        st.session_state.qbank.extend(qs)
-                        save_json(st.session_state.qbank, QBANK_FILE)
-                        start_exam(qs)
+                    if start_generated_exam(api_key, topic, num_q, category=topic):
                         st.rerun()
                         
     with tab2:
@@ -335,23 +436,40 @@ def render_dashboard():
             elif not uploaded_file: st.error("Please upload a PDF!")
             else:
                 with st.spinner("Reading PDF and dynamically selecting AI model..."):
-                    text = extract_text_from_pdf(uploaded_file)
                     topic_str = pdf_topic if pdf_topic else "the provided document"
-                    qs = generate_questions_from_ai(api_key, topic_str, pdf_text=text, num_q=num_q_pdf)
-                    if qs: 
-                        st.session_state.qbank.extend(qs)
-                        save_json(st.session_state.qbank, QBANK_FILE)
-                        start_exam(qs)
+                    # Pages are read lazily and chunked; questions are spread over the whole document
+                    plan = pdf_pipeline.build_plan(uploaded_file, num_q_pdf)
+                    if start_generated_exam(api_key, topic_str, num_q_pdf, category=pdf_topic or uploaded_file.name, plan=plan):
                         st.rerun()
                         
     with tab3:
         st.subheader("Start Exam from Global Question Bank")
-        if not st.session_state.qbank:
+        qbank = get_qbank()
+        if not qbank:
             st.warning("Your question bank is empty. Generate some questions first, or paste JSON below.")
         else:
-            if st.button(f"Start Grand Test with All Saved Questions ({len(st.session_state.qbank)})", type="primary"):
-                start_exam(st.session_state.qbank)
-                st.rerun()
+            cat_counts = qbank.categories()
+            categories = st.multiselect("Categories", list(cat_counts), default=list(cat_counts),
+                                        format_func=lambda c: f"{c} ({cat_counts[c]})")
+            source = st.radio("Questions", list(exam_builder.SOURCE_LABELS), horizontal=True,
+                              format_func=exam_builder.SOURCE_LABELS.__getitem__)
+            in_categories = sum(cat_counts[c] for c in categories)
+            if not in_categories:
+                st.info("No saved questions match these filters.")
+            else:
+                size = st.number_input(f"Number of Questions (max {in_categories})", 1, in_categories, min(100, in_categories))
+                # Built for the requested size, so due questions are not all collected on every rerun
+                pools = exam_builder.candidate_pools(qbank, get_analytics(), categories, source, get_scheduler(), size)
+                available = sum(len(pool) for pool in pools.values())
+                if not available:
+                    st.info("No saved questions match these filters.")
+                elif available < size:
+                    st.caption(f"Only {available} saved questions match these filters.")
+                if available and st.button("Build & Start Exam", type="primary"):
+                    # Sampled per category in proportion to how many questions each one offers
+                    ids = exam_builder.build_exam(pools, size, source)
+                    start_exam(qbank.resolve(ids))
+                    st.rerun()
                 
         st.divider()
         st.info("Paste a JSON code block from a previous chat to add it to your bank.")
@@ -359,37 +477,260 @@ def render_dashboard():
         if st.button("Import JSON & Start"):
             try:
                 qs = json.loads(raw_json)
-                st.session_state.qbank.extend(qs)
-                save_json(st.session_state.qbank, QBANK_FILE)
-                start_exam(qs)
+                start_exam(add_to_qbank(qs))
                 st.rerun()
             except Exception as e:
                 st.error("Invalid JSON format.")
+        
+        st.divider()
+        render_bulk_io()
+
+    with tab_search:
+        render_search()
 
     with tab4:
         st.subheader("Your Exam History")
-        if not st.session_state.history:
+        history = get_history()
+        if not len(history):
             st.info("You haven't taken any exams yet. Generate one to get started!")
         else:
-            for rec in st.session_state.history:
+            render_performance()
+            # One page of lightweight summaries per rerun; full records load on Review/Retake
+            pages = (len(history) + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+            page = max(0, min(st.session_state.history_page, pages - 1))
+            for pos, rec in history.page(page, HISTORY_PAGE_SIZE):
                 with st.container(border=True):
                     cols = st.columns([4, 2, 2])
                     cols[0].markdown(f"**Exam Taken:** {rec['date']}<br>Questions: {rec['total']}", unsafe_allow_html=True)
                     cols[0].markdown(f"**Score:** <span style='color:green; font-size:18px; font-weight:bold;'>{rec['score']} / {rec['total']}</span>", unsafe_allow_html=True)
                     
-                    if cols[1].button("🔍 Review Exam", key=f"rev_{rec['id']}", use_container_width=True):
-                        load_past_exam(rec, is_retake=False)
-                        st.rerun()
-                    if cols[2].button("🔄 Retake Exam", key=f"ret_{rec['id']}", use_container_width=True):
-                        load_past_exam(rec, is_retake=True)
-                        st.rerun()
+                    cols[1].button("🔍 Review Exam", key=f"rev_{pos}", on_click=open_past_exam, args=(pos, False), use_container_width=True)
+                    cols[2].button("🔄 Retake Exam", key=f"ret_{pos}", on_click=open_past_exam, args=(pos, True), use_container_width=True)
+            if pages > 1:
+                nav_c1, nav_c2, nav_c3 = st.columns([1, 2, 1])
+                with nav_c1: st.button("◀ Newer", key="hist_page_prev", on_click=set_history_page, args=(page - 1,), disabled=page == 0, use_container_width=True)
+                with nav_c2: st.markdown(f"<div style='text-align:center; padding-top:8px;'>Page {page + 1} of {pages}</div>", unsafe_allow_html=True)
+                with nav_c3: st.button("Older ▶", key="hist_page_next", on_click=set_history_page, args=(page + 1,), disabled=page == pages - 1, use_container_width=True)
+
+@profiling.traced()
+def render_bulk_io():
+    st.subheader("Bulk Import & Export")
+    uploaded = st.file_uploader("Question file (JSON array, JSON Lines or CSV)", type=['json', 'jsonl', 'ndjson', 'csv'])
+    st.caption("CSV columns: question, option_1 … option_N, correct_answer, rationale, hint, category.")
+    import_category = st.text_input("Category for questions without one (Optional)", key="import_category")
+    if st.button("Import File", disabled=uploaded is None):
+        progress = st.empty()
+        try:
+            # Parsed record by record and written in batches; bad rows are reported, not fatal
+            report = bulk_io.import_upload(uploaded, get_qbank(), category=import_category or None,
+                                           progress=lambda r: progress.caption(f"{r.imported} questions imported..."))
+        except (ValueError, csv.Error) as e:
+            progress.empty()
+            st.error(f"Could not import this file: {e}")
+        else:
+            progress.success(f"{report.imported} of {report.rows} questions imported ({report.added} new to your bank).")
+            if report.error_count:
+                st.warning(f"{report.error_count} rows were skipped.")
+                st.dataframe([{"Row": row if row is not None else "-", "Error": msg} for row, msg in report.errors[:100]], hide_index=True)
+                st.download_button("Download error report", report.errors_csv(), file_name="import_errors.csv", mime="text/csv")
+    
+    qbank = get_qbank()
+    if qbank:
+        exp_c1, exp_c2 = st.columns([1, 3])
+        fmt = exp_c1.selectbox("Export format", bulk_io.FORMATS, format_func=str.upper, label_visibility="collapsed")
+        # Generated only when the button is clicked, not on every rerun
+        exp_c2.download_button(f"Export {len(qbank)} questions", lambda: bulk_io.export_bytes(qbank.questions(), fmt),
+                               file_name=f"question_bank.{fmt}", mime="application/octet-stream")
+
+SEARCH_RESULTS_SHOWN = 50
+
+@profiling.traced()
+def render_search():
+    st.subheader("Search the Question Bank")
+    qbank = get_qbank()
+    query = st.text_input("Search", placeholder="Words from the question, options, explanation or category...",
+                          key="search_query", label_visibility="collapsed")
+    if not query.strip():
+        return
+    with st.spinner("Indexing question bank..."): # Only the first search builds the index
+        ids, total = qbank.search(query, SEARCH_RESULTS_SHOWN)
+    if not total:
+        st.info("No questions match every word of this search.")
+        return
+    st.caption(f"{total} matching questions" + (f", best {len(ids)} shown" if total > len(ids) else ""))
+    st.dataframe([
+        {"Question": q.text, "Answer": q.correct_answer, "Category": q.category or question_store.UNCATEGORIZED}
+        for q in qbank.resolve(ids)
+    ], hide_index=True)
+    size = st.number_input(f"Number of Questions (max {total})", 1, total, min(100, total), key="search_exam_size")
+    if st.button("Start Exam from Results", type="primary"):
+        # The best matches, shuffled
+        start_exam(qbank.resolve(exam_builder.search_exam(qbank, query, size)))
+        st.rerun()
+
+@profiling.traced()
+def render_performance():
+    stats = get_analytics()
+    def pct(value):
+        return f"{value:.0%}" if value is not None else "-"
+    with st.expander("📈 Performance by Category"):
+        st.dataframe([
+            {"Category": cat, "Attempts": s.attempts, "Accuracy": pct(s.accuracy), "Skipped": s.skipped,
+             "Guessed": s.guessed, "Guess accuracy": pct(s.guess_accuracy), "Sure accuracy": pct(s.sure_accuracy),
+             "Last seen": analytics.format_age(s.last_seen)}
+            for cat, s in sorted(stats.categories().items())
+        ], hide_index=True)
+        missed = stats.most_missed()
+        if missed:
+            st.markdown("**Most missed questions**")
+            qbank = get_qbank()
+            st.dataframe([
+                {"Question": qbank.get(qid).text, "Wrong": s.wrong, "Attempts": s.attempts, "Last seen": analytics.format_age(s.last_seen)}
+                for qid, s in missed
+            ], hide_index=True)
 
 # --- 7. EXAM UI ---
-def render_exam_ui():
+PALETTE_PAGE_SIZE = 40
+PALETTE_COLS = 4
+EXAM_INDICATORS = {0: "⚪", 1: "🟢", 2: "🔴", 3: "🟣", 4: "✅"}
+REVIEW_INDICATORS = {scoring.SKIPPED: "⬜", scoring.CORRECT: "🟩", scoring.WRONG: "🟥"}
+
+@profiling.traced()
+def set_palette_page(page):
+    st.session_state.palette_page = page
+
+@profiling.traced()
+def render_palette(total_q, idx, indicator_for, key_prefix):
+    # Only one page of the palette is rendered per rerun, so the widget count stays
+    # constant however many questions the exam has. The page follows the current
+    # question unless the user flips pages with the arrows.
+    pages = (total_q + PALETTE_PAGE_SIZE - 1) // PALETTE_PAGE_SIZE
+    page = st.session_state.palette_page
+    if page is None:
+        page = idx // PALETTE_PAGE_SIZE
+    page = max(0, min(page, pages - 1))
+    start = page * PALETTE_PAGE_SIZE
+    end = min(start + PALETTE_PAGE_SIZE, total_q)
+    
+    if pages > 1:
+        nav_c1, nav_c2, nav_c3 = st.columns([1, 2, 1])
+        with nav_c1: st.button("◀", key=f"{key_prefix}_page_prev", on_click=set_palette_page, args=(page - 1,), disabled=page == 0, use_container_width=True)
+        with nav_c2: st.markdown(f"<div style='text-align:center; font-size:12px; padding-top:8px;'>{start + 1}–{end} of {total_q}</div>", unsafe_allow_html=True)
+        with nav_c3: st.button("▶", key=f"{key_prefix}_page_next", on_click=set_palette_page, args=(page + 1,), disabled=page == pages - 1, use_container_width=True)
+    
+    for i in range(start, end, PALETTE_COLS):
+        row_cols = st.columns(PALETTE_COLS)
+        for j in range(PALETTE_COLS):
+            if i + j < end:
+                q_num = i + j
+                label = f"{indicator_for(q_num)} {q_num + 1}"
+                if q_num == idx: label = f"▶ {q_num + 1}"
+                
+                with row_cols[j]:
+                    st.button(label, key=f"{key_prefix}_{q_num}", on_click=jump_to_question, args=(q_num,), use_container_width=True)
+
+TIMER_HTML = """
+<div id="timer" style="text-align:right; color:#d32f2f; font-weight:bold; font-family:sans-serif; font-size:16px;"></div>
+<script>
+const target = {target}, countdown = {countdown}, label = "{label}";
+const pad = n => String(n).padStart(2, '0');
+function tick() {{
+    const s = Math.max(0, Math.floor((countdown ? target - Date.now() : Date.now() - target) / 1000));
+    document.getElementById('timer').textContent = label + pad(Math.floor(s / 3600)) + ':' + pad(Math.floor(s / 60) % 60) + ':' + pad(s % 60);
+}}
+tick();
+setInterval(tick, 1000);
+</script>
+"""
+
+@profiling.traced()
+def render_timer(exam):
+    # The clock ticks in the browser; the markup only changes when the deadline does,
+    # so reruns do not restart it and no rerun is needed per second.
+    if exam.deadline is not None:
+        html = TIMER_HTML.format(target=int(exam.deadline * 1000), countdown="true", label="Time Left: ")
+    else:
+        html = TIMER_HTML.format(target=int(exam.started_at * 1000), countdown="false", label="Time Elapsed: ")
+    st.iframe(html, height=28)
+    if exam.deadline is not None:
+        watch_deadline()
+
+@st.fragment(run_every=2)
+@profiling.traced()
+def watch_deadline():
+    # Server-side check; only this fragment reruns until time is up, then the
+    # full app rerun submits the exam (see main)
+    if st.session_state.mode == 'exam' and st.session_state.exam.expired():
+        st.rerun()
+
+@st.fragment(run_every=2)
+@profiling.traced()
+def render_generation_status():
+    # Polls the background batches on its own timer; the page only reruns when
+    # new questions have been appended to the exam.
+    if append_generated_questions():
+        st.rerun()
+    job = st.session_state.gen_job
+    if job is not None:
+        st.caption(f"⏳ Generating more questions... {job.delivered_batches} of {job.total_batches} batches ready.")
+
+# The exam and review screens are split into keyed fragments: the question
+# pane, the legend and the palette. Answering, flagging a guess or flipping
+# palette pages reruns only the fragment the widget lives in, and navigation
+# callbacks rerun just the panes that changed (rerun_panes). The CSS, the
+# session-state checks and the static markup around the panes (top bar,
+# profile box, headers, action buttons, timer) only run on full reruns, which
+# are left for mode changes: Submit, Return to Dashboard, the deadline.
+EXAM_PANES = ["exam_question", "exam_legend", "exam_palette"]
+REVIEW_PANES = ["review_question", "review_palette"]
+
+def rerun_panes():
+    # Called last in navigation callbacks, instead of a full rerun
+    st.rerun(EXAM_PANES if st.session_state.mode == 'exam' else REVIEW_PANES)
+
+@st.fragment(key="exam_question")
+@profiling.traced()
+def render_exam_question():
     idx = st.session_state.current_q_idx
-    q_data = st.session_state.active_questions[idx]
-    total_q = len(st.session_state.active_questions)
+    exam = st.session_state.exam
+    q = active_question(idx)
+    st.markdown(f"<div class='q-no'>Question no : {idx + 1}</div>", unsafe_allow_html=True)
+    
+    st.markdown(f"<div class='q-text'>{q.text}</div>", unsafe_allow_html=True)
+    
+    # Radio values are option indexes; labels come from the precomputed option tuple
+    st.radio("Options", range(len(q.options)), index=exam.response(idx),
+             format_func=q.options.__getitem__, key=f"radio_{idx}", label_visibility="collapsed")
+    
+    st.markdown("<br>", unsafe_allow_html=True)
     
+    # Active Guessing logic
+    is_guessed = st.checkbox("I am guessing this ℹ️", value=exam.is_guess(idx), key=f"guess_cb_{idx}")
+    exam.set_guess(idx, is_guessed)
+
+@st.fragment(key="exam_legend")
+@profiling.traced()
+def render_exam_legend():
+    stats = st.session_state.exam.counts # Maintained on every status change, no rescan
+    st.markdown(f"""
+    <div class='legend-grid'>
+        <div>🟢 {stats[1]} Answered</div>
+        <div>🔴 {stats[2]} Not Answered</div>
+        <div>⚪ {stats[0]} Not Visited</div>
+        <div>🟣 {stats[3]} Marked</div>
+    </div>
+    <div style='font-size:12px; margin-bottom:15px;'>✅ {stats[4]} Ans & Marked (Will not be evaluated)</div>
+    """, unsafe_allow_html=True)
+
+@st.fragment(key="exam_palette")
+@profiling.traced()
+def render_exam_palette():
+    exam = st.session_state.exam
+    render_palette(len(st.session_state.active_ids), st.session_state.current_q_idx,
+                   lambda q_num: EXAM_INDICATORS[exam.status(q_num)], "nav")
+
+@profiling.traced()
+def render_exam_ui():
     st.markdown("<div class='top-bar-marrow'><span>📄 Question Paper &nbsp;&nbsp;|&nbsp;&nbsp; ℹ️ Instructions</span></div>", unsafe_allow_html=True)
     
     col_main, col_side = st.columns([3.5, 1.5], gap="medium")
@@ -397,26 +738,9 @@ def render_exam_ui():
     with col_main:
         # Reduced height so buttons stay fixed at the bottom of the screen without needing to scroll the main page
         with st.container(height=480, border=True):
-            st.markdown(f"<div style='text-align:right; color:#d32f2f; font-weight:bold;'>Time Left: 00:32:04</div>", unsafe_allow_html=True)
+            render_timer(st.session_state.exam)
             st.markdown("<div class='q-type-bar'>Question type : MCQ</div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='q-no'>Question no : {idx + 1}</div>", unsafe_allow_html=True)
-            
-            st.markdown(f"<div class='q-text'>{q_data.get('question', '')}</div>", unsafe_allow_html=True)
-            
-            options = q_data.get('options', [])
-            if not options and 'answerOptions' in q_data:
-                options = [opt.get('text', '') for opt in q_data.get('answerOptions', [])]
-                
-            current_ans = st.session_state.responses.get(idx, None)
-            default_idx = options.index(current_ans) if current_ans in options else None
-            
-            st.radio("Options", options, index=default_idx, key=f"radio_{idx}", label_visibility="collapsed")
-            
-            st.markdown("<br>", unsafe_allow_html=True)
-            
-            # Active Guessing logic
-            is_guessed = st.checkbox("I am guessing this ℹ️", value=st.session_state.guesses.get(idx, False), key=f"guess_cb_{idx}")
-            st.session_state.guesses[idx] = is_guessed
+            render_exam_question()
             
         # Action Buttons Fixed Below Container (They will no longer be pushed down by long questions)
         btn_c1, btn_c2, btn_spacer, btn_c3, btn_c4 = st.columns([2.5, 2, 1, 2.5, 2])
@@ -424,6 +748,9 @@ def render_exam_ui():
         with btn_c2: st.button("Clear Response", on_click=clear_response, use_container_width=True)
         with btn_c3: st.button("Save and Next", on_click=save_and_next, type="primary", use_container_width=True)
         with btn_c4: st.button("Submit", on_click=submit_exam, type="primary", use_container_width=True)
+        
+        if st.session_state.gen_job is not None:
+            render_generation_status()
 
     with col_side:
         # Adjusted height to match the new left column layout
@@ -434,55 +761,60 @@ def render_exam_ui():
                 <div style='line-height:1.2;'><b>Candidate Name</b><br><span style='color:gray; font-size:12px;'>INI SS Aspirant</span></div>
             </div>
             """, unsafe_allow_html=True)
-            
-            stats = {0:0, 1:0, 2:0, 3:0, 4:0}
-            for s in st.session_state.statuses.values(): stats[s] = stats.get(s, 0) + 1
-                
-            st.markdown(f"""
-            <div class='legend-grid'>
-                <div>🟢 {stats[1]} Answered</div>
-                <div>🔴 {stats[2]} Not Answered</div>
-                <div>⚪ {stats[0]} Not Visited</div>
-                <div>🟣 {stats[3]} Marked</div>
-            </div>
-            <div style='font-size:12px; margin-bottom:15px;'>✅ {stats[4]} Ans & Marked (Will not be evaluated)</div>
-            <div class='palette-header'>All questions</div>
-            """, unsafe_allow_html=True)
-            
-            cols_per_row = 4
-            for i in range(0, total_q, cols_per_row):
-                row_cols = st.columns(cols_per_row)
-                for j in range(cols_per_row):
-                    if i + j < total_q:
-                        q_num = i + j
-                        stat = st.session_state.statuses[q_num]
-                        
-                        if stat == 1: indicator = "🟢"
-                        elif stat == 2: indicator = "🔴"
-                        elif stat == 3: indicator = "🟣"
-                        elif stat == 4: indicator = "✅"
-                        else: indicator = "⚪"
-                        
-                        label = f"{indicator} {q_num + 1}"
-                        if q_num == idx: label = f"▶ {q_num + 1}"
-                        
-                        with row_cols[j]:
-                            st.button(label, key=f"nav_{q_num}", on_click=jump_to_question, args=(q_num,), use_container_width=True)
+            render_exam_legend()
+            st.markdown("<div class='palette-header'>All questions</div>", unsafe_allow_html=True)
+            render_exam_palette()
 
 # --- 8. REVIEW / RESULTS UI ---
-def render_review_ui():
+@st.fragment(key="review_question")
+@profiling.traced()
+def render_review_question():
     idx = st.session_state.current_q_idx
-    q_data = st.session_state.active_questions[idx]
-    total_q = len(st.session_state.active_questions)
+    q = active_question(idx)
+    st.markdown(f"<div class='q-no'>Question no : {idx + 1}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='q-text'>{q.text}</div>", unsafe_allow_html=True)
+    
+    rationale = q.rationale or 'No rationale provided.'
+    correct_ans = q.correct_idx
+    user_ans = st.session_state.exam.response(idx)
     
-    # Calculate regular stats
-    correct_count = sum(1 for i, q in enumerate(st.session_state.active_questions) if st.session_state.responses.get(i) == get_correct_answer(q))
-    wrong_count = sum(1 for i, q in enumerate(st.session_state.active_questions) if st.session_state.responses.get(i) is not None and st.session_state.responses.get(i) != get_correct_answer(q))
-    skipped_count = total_q - correct_count - wrong_count
+    for opt_idx, opt in enumerate(q.options):
+        if opt_idx == correct_ans and opt_idx == user_ans:
+            st.markdown(f"<div class='opt-correct'>✔️ {opt} <br><small>(Your Answer & Correct)</small></div>", unsafe_allow_html=True)
+        elif opt_idx == user_ans:
+            st.markdown(f"<div class='opt-wrong'>❌ {opt} <br><small>(Your Answer - Incorrect)</small></div>", unsafe_allow_html=True)
+        elif opt_idx == correct_ans:
+            st.markdown(f"<div class='opt-correct'>👉 {opt} <br><small>(Correct Answer)</small></div>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div class='opt-neutral'>{opt}</div>", unsafe_allow_html=True)
+            
+    if user_ans is None:
+        st.warning("You skipped this question.")
+        
+    # Show if user guessed this specific question
+    if st.session_state.exam.is_guess(idx):
+        st.info("🤔 You marked this question as a guess during the exam.")
+        
+    st.markdown(f"<div class='rationale-box'><b>Explanation:</b><br>{rationale}</div><br>", unsafe_allow_html=True)
+
+@st.fragment(key="review_palette")
+@profiling.traced()
+def render_review_palette():
+    result = st.session_state.result
+    render_palette(len(st.session_state.active_ids), st.session_state.current_q_idx,
+                   lambda q_num: REVIEW_INDICATORS[result.verdict(q_num)], "rev_nav")
 
-    # Calculate guessing stats
-    total_guessed = sum(1 for v in st.session_state.guesses.values() if v)
-    guessed_correct = sum(1 for i, q in enumerate(st.session_state.active_questions) if st.session_state.guesses.get(i) and st.session_state.responses.get(i) == get_correct_answer(q))
+@profiling.traced()
+def render_review_ui():
+    total_q = len(st.session_state.active_ids)
+    
+    # Stats were computed once at submit (or when the record was opened)
+    result = st.session_state.result
+    correct_count = result.correct
+    wrong_count = result.wrong
+    skipped_count = result.skipped
+    total_guessed = result.guessed
+    guessed_correct = result.guessed_correct
 
     st.markdown("<div class='top-bar-marrow' style='background-color:#1e3c72;'><span>📊 Exam Review Mode</span></div>", unsafe_allow_html=True)
     
@@ -490,44 +822,12 @@ def render_review_ui():
     
     with col_main:
         with st.container(height=480, border=True):
-            st.markdown(f"<div class='q-no'>Question no : {idx + 1}</div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='q-text'>{q_data.get('question', '')}</div>", unsafe_allow_html=True)
-            
-            options = q_data.get('options', [])
-            rationale = q_data.get('rationale', 'No rationale provided.')
-            
-            if not options and 'answerOptions' in q_data:
-                for opt in q_data.get('answerOptions', []):
-                    options.append(opt.get('text', ''))
-                    if opt.get('isCorrect') and 'rationale' in opt:
-                        rationale = opt.get('rationale')
-            
-            correct_ans = get_correct_answer(q_data)
-            user_ans = st.session_state.responses.get(idx)
-            
-            for opt in options:
-                if opt == correct_ans and opt == user_ans:
-                    st.markdown(f"<div class='opt-correct'>✔️ {opt} <br><small>(Your Answer & Correct)</small></div>", unsafe_allow_html=True)
-                elif opt == user_ans:
-                    st.markdown(f"<div class='opt-wrong'>❌ {opt} <br><small>(Your Answer - Incorrect)</small></div>", unsafe_allow_html=True)
-                elif opt == correct_ans:
-                    st.markdown(f"<div class='opt-correct'>👉 {opt} <br><small>(Correct Answer)</small></div>", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div class='opt-neutral'>{opt}</div>", unsafe_allow_html=True)
-                    
-            if user_ans is None:
-                st.warning("You skipped this question.")
-                
-            # Show if user guessed this specific question
-            if st.session_state.guesses.get(idx):
-                st.info("🤔 You marked this question as a guess during the exam.")
-                
-            st.markdown(f"<div class='rationale-box'><b>Explanation:</b><br>{rationale}</div><br>", unsafe_allow_html=True)
+            render_review_question()
             
         btn_c1, btn_c2, btn_c3 = st.columns([1, 2, 1])
-        with btn_c1: st.button("⬅️ Previous", on_click=move_to_prev, use_container_width=True)
+        with btn_c1: st.button("⬅️ Previous", on_click=review_prev, use_container_width=True)
         with btn_c2: st.button("Return to Dashboard", on_click=go_to_dashboard, type="primary", use_container_width=True)
-        with btn_c3: st.button("Next ➡️", on_click=move_to_next, use_container_width=True)
+        with btn_c3: st.button("Next ➡️", on_click=review_next, use_container_width=True)
 
     with col_side:
         with st.container(height=560, border=True):
@@ -544,34 +844,60 @@ def render_review_ui():
             <div class='palette-header'>Review Palette</div>
             """, unsafe_allow_html=True)
             
-            cols_per_row = 4
-            for i in range(0, total_q, cols_per_row):
-                row_cols = st.columns(cols_per_row)
-                for j in range(cols_per_row):
-                    if i + j < total_q:
-                        q_num = i + j
-                        
-                        ans = st.session_state.responses.get(q_num)
-                        corr = get_correct_answer(st.session_state.active_questions[q_num])
-                        
-                        if ans is None: indicator = "⬜"
-                        elif ans == corr: indicator = "🟩"
-                        else: indicator = "🟥"
-                        
-                        label = f"{indicator} {q_num + 1}"
-                        if q_num == idx: label = f"▶ {q_num + 1}"
-                        
-                        with row_cols[j]:
-                            st.button(label, key=f"rev_nav_{q_num}", on_click=jump_to_question, args=(q_num,), use_container_width=True)
+            render_review_palette()
 
-# --- 9. APP ROUTING ---
+# --- 9. PROFILER (EXAM_PROFILE=1) ---
+def widget_count():
+    # Widgets registered so far in this rerun
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    ids = ctx.shared.widget_ids_this_run if hasattr(ctx, 'shared') else ctx.widget_ids_this_run
+    return len(ids.snapshot() if hasattr(ids, 'snapshot') else ids)
+
+def finish_profile(run):
+    run.finish(widget_count())
+    st.session_state.profile_runs.append(run)
+    st.session_state.profile_since = run.ended
+
+def render_profiler(run):
+    runs = list(st.session_state.profile_runs)
+    with st.sidebar.expander("🛠️ Profiler", expanded=True):
+        st.caption(f"Last rerun: {run.duration * 1000:.1f} ms, {run.widgets} widgets, {len(run.spans)} spans")
+        rows = [{"Span": "  " * s[4] + s[1], "Start (ms)": round((s[2] - run.started) * 1000, 1), "ms": round(s[3] * 1000, 2)}
+                for s in run.spans]
+        rows += [{"Span": f"[{s[6]}] {s[1]}", "Start (ms)": round((s[2] - run.started) * 1000, 1), "ms": round(s[3] * 1000, 2)}
+                 for s in run.background]
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        slowest = sorted(runs, key=lambda r: r.duration, reverse=True)[:5]
+        st.caption("Slowest recent reruns: " + ", ".join(f"{r.duration * 1000:.0f} ms" for r in slowest))
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        st.download_button("Download JSON", profiling.to_json(runs), file_name=f"profile_{stamp}.json",
+                           mime="application/json", use_container_width=True)
+        st.download_button("Download Chrome trace", profiling.to_chrome_trace(runs), file_name=f"trace_{stamp}.json",
+                           mime="application/json", use_container_width=True)
+
+# --- 10. APP ROUTING ---
 def main():
-    if st.session_state.mode == 'exam':
-        render_exam_ui()
-    elif st.session_state.mode == 'review':
-        render_review_ui()
-    else:
-        render_dashboard()
+    try:
+        with profiling.span("main.route"):
+            if st.session_state.mode == 'exam' and st.session_state.exam.expired():
+                # Enforced here for every rerun, whatever triggered it
+                submit_exam()
+                st.toast("⏰ Time is up! Your exam was submitted automatically.")
+            if st.session_state.mode == 'exam':
+                render_exam_ui()
+            elif st.session_state.mode == 'review':
+                render_review_ui()
+            else:
+                render_dashboard()
+    finally:
+        # Also records reruns cut short by st.rerun()
+        if PROFILE_RUN is not None:
+            finish_profile(PROFILE_RUN)
+    if PROFILE_RUN is not None:
+        render_profiler(PROFILE_RUN)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,279 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Headless benchmarks for the exam engine, persistence, PDF and generation
+# paths. Everything runs in a scratch directory, the app is driven through
+# Streamlit's AppTest (no browser) and Gemini is replaced by gemini_stub (no
+# network). The suite runs twice: once for latency (median of the repeats)
+# and once under tracemalloc for the peak memory of each operation.
+#
+#   python benchmarks/run.py                      # compare with baselines.json
+#   python benchmarks/run.py --sizes 1000,100000 --save-baseline
+#
+# Exits with status 1 if an operation got slower or bigger than its baseline
+# by more than --tolerance.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+sys.path.insert(0, REPO)
+sys.path.insert(0, HERE)
+os.environ["GEN_CACHE_TTL"] = "0"  # time the (stubbed) model calls, not the reply cache
+
+import analytics  # noqa: E402
+import bulk_io  # noqa: E402
+import exam_builder  # noqa: E402
+import gemini_client  # noqa: E402
+import gemini_stub  # noqa: E402
+import generation  # noqa: E402
+import pdf_pipeline  # noqa: E402
+import question_store  # noqa: E402
+import scoring  # noqa: E402
+import synthetic  # noqa: E402
+from exam_session import ANSWERED, ExamSession  # noqa: E402
+from question_model import parse_questions  # noqa: E402
+
+APP = os.path.join(REPO, "app_exam.py")
+BASELINE_FILE = os.path.join(HERE, "baselines.json")
+DEFAULT_SIZES = "1000,10000"
+MIN_SECONDS_DELTA = 0.005   # below this a slowdown is noise
+MIN_PEAK_DELTA_KB = 256
+
+
+class Recorder:
+    def __init__(self, traced):
+        self.traced = traced
+        self.results = {}
+
+    def measure(self, name, size, fn, repeat=1, setup=None):
+        # Runs setup() (untimed) and fn(setup result) repeat times; returns the last result.
+        samples, peak, result = [], 0, None
+        for _ in range(repeat if not self.traced else 1):
+            arg = setup() if setup else None
+            if self.traced:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = fn(arg) if setup else fn()
+            samples.append(time.perf_counter() - start)
+            if self.traced:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        key = f"{name}@{size}"
+        if self.traced:
+            self.results[key] = {"peak_kb": round(peak / 1024, 1)}
+        else:
+            self.results[key] = {"seconds": round(statistics.median(samples), 5)}
+        return result
+
+
+def bench_bank(rec, size, workdir):
+    raws = {schema: synthetic.make_bank(size, schema) for schema in ("options", "answerOptions")}
+    for schema, raw in raws.items():
+        rec.measure(f"parse[{schema}]", size, lambda raw=raw: parse_questions(raw), repeat=3)
+    questions = parse_questions(raws["options"])[0]
+
+    counter = iter(range(1_000_000))
+    def fresh_path():
+        return os.path.join(workdir, f"bank_{next(counter)}.jsonl")
+    rec.measure("store.add_many", size, lambda path: question_store.QuestionStore(path).add_many(questions),
+                repeat=3, setup=fresh_path)
+    bank_path = fresh_path()
+    question_store.QuestionStore(bank_path).add_many(questions)
+    store = rec.measure("store.load", size, lambda: question_store.QuestionStore(bank_path), repeat=3)
+
+    legacy_path = os.path.join(workdir, "legacy.json")
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        json.dump(raws["options"], f)
+    def legacy_copy():
+        path = fresh_path()
+        shutil.copyfile(legacy_path, f"{path}.json")
+        return path
+    rec.measure("store.migrate_legacy", size, lambda path: question_store.QuestionStore(path, f"{path}.json"),
+                repeat=2, setup=legacy_copy)
+
+    def bulk_import(path):
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            return bulk_io.import_questions(f, 'json', question_store.QuestionStore(path))
+    rec.measure("bulk_io.import_json", size, bulk_import, repeat=2, setup=fresh_path)
+    rec.measure("bulk_io.export_csv", size, lambda: bulk_io.export_bytes(store.questions(), 'csv'), repeat=3)
+
+    query = " ".join(questions[len(questions) // 2].text.split()[1:3])
+    rec.measure("store.search_build", size, lambda s: s.search(query, 50), repeat=2,
+                setup=lambda: question_store.QuestionStore(bank_path))
+    rec.measure("store.search", size, lambda: store.search(query, 50), repeat=5)
+
+    stats = analytics.Analytics(store, os.path.join(workdir, "analytics.jsonl"))
+    categories = list(store.categories())
+    for source in (exam_builder.SOURCE_ALL, exam_builder.SOURCE_UNSEEN):
+        rec.measure(f"exam_builder.build[{source}]", size, lambda source=source: exam_builder.build_exam(
+            exam_builder.candidate_pools(store, stats, categories, source), 100), repeat=5)
+
+    rng = random.Random(0)
+    exam = ExamSession(len(questions))
+    for i in range(len(questions)):
+        if rng.random() < 0.8:
+            exam.set_response(i, rng.randrange(4))
+            exam.set_status(i, ANSWERED)
+    rec.measure("scoring.score_exam", size, lambda: scoring.score_exam(questions, exam), repeat=3)
+    return bank_path
+
+
+def bench_app(rec, size, bank_path, exam_size, workdir):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    appdir = os.path.join(workdir, "app")
+    os.makedirs(appdir)
+    shutil.copyfile(bank_path, os.path.join(appdir, question_store.QUESTIONS_FILE))
+    cwd = os.getcwd()
+    os.chdir(appdir)
+    try:
+        def button(at, label):
+            return next(b for b in at.button if b.label == label)
+
+        def cold_start():
+            st.cache_resource.clear()  # a new server process: shared bank not loaded yet
+            at = AppTest.from_file(APP, default_timeout=300)
+            return at.run()
+        at = rec.measure("app.cold_start", size, cold_start)
+        rec.measure("app.dashboard_rerun", size, lambda: at.run(), repeat=3)
+
+        target = min(exam_size, size)
+        at.number_input[0].set_value(target).run()
+        rec.measure("app.start_exam", size, lambda: button(at, "Build & Start Exam").click().run())
+        rec.measure("app.save_and_next", size, lambda _: button(at, "Save and Next").click().run(),
+                    repeat=5, setup=lambda: at.radio[0].set_value(1).run())
+        rec.measure("app.jump_to_question", size, lambda: next(b for b in at.button if b.label.endswith(" 2")).click().run())
+        # Navigation only reruns the exam/review fragments, so AppTest's tree then
+        # lacks the buttons around them; a full run (untimed) brings them back.
+        rec.measure("app.submit_exam", size, lambda _: button(at, "Submit").click().run(), setup=at.run)
+        rec.measure("app.review_next", size, lambda _: button(at, "Next ➡️").click().run(), repeat=5, setup=at.run)
+        button(at.run(), "Return to Dashboard").click().run()
+        rec.measure("app.open_past_exam", size, lambda: next(b for b in at.button if "Review Exam" in b.label).click().run())
+        if at.exception:
+            raise RuntimeError(f"app raised during the benchmark: {at.exception[0].message}")
+    finally:
+        os.chdir(cwd)
+
+
+def bench_pdf(rec, pages, workdir):
+    pdf_bytes = synthetic.make_pdf_pages(pages)
+
+    def extract():
+        total, page_iter = pdf_pipeline.extract_pages(io.BytesIO(pdf_bytes))
+        return sum(len(text) for text in page_iter)
+    rec.measure("pdf.extract_pages", pages, extract, repeat=2)
+
+    cache_dir = os.path.join(workdir, "pdf_cache")
+    def plan(_=None):
+        total, page_iter = pdf_pipeline.pdf_cache.cached_pages(io.BytesIO(pdf_bytes), pdf_pipeline.extract_pages, cache_dir)
+        return list(pdf_pipeline.plan_from_pages(page_iter, total, 50))
+    rec.measure("pdf.plan_cold", pages, plan, setup=lambda: shutil.rmtree(cache_dir, ignore_errors=True), repeat=2)
+    rec.measure("pdf.plan_cached", pages, plan, repeat=3)
+
+
+def bench_generation(rec, num_q):
+    def first():
+        job = generation.GenerationJob("BENCH_KEY", "Benchmark topic", num_q)
+        questions = job.wait_first()
+        job.cancel()  # do not let the rest slow down the next sample
+        return questions
+    def everything():
+        job = generation.GenerationJob("BENCH_KEY", "Benchmark topic", num_q)
+        questions = job.wait_first()
+        while not job.done:
+            questions += job.poll()
+            time.sleep(0.005)
+        return questions
+    rec.measure("generation.first_batch", num_q, first, repeat=3)
+    rec.measure("generation.all_batches", num_q, everything, repeat=3)
+
+
+def run_suite(traced, sizes, exam_size, pdf_pages, gen_questions):
+    rec = Recorder(traced)
+    workdir = tempfile.mkdtemp(prefix="exam_bench_")
+    try:
+        for size in sizes:
+            sizedir = os.path.join(workdir, str(size))
+            os.makedirs(sizedir)
+            bank_path = bench_bank(rec, size, sizedir)
+            bench_app(rec, size, bank_path, exam_size, sizedir)
+        bench_pdf(rec, pdf_pages, workdir)
+        bench_generation(rec, gen_questions)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rec.results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, now in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if now["seconds"] > base["seconds"] * (1 + tolerance) and now["seconds"] - base["seconds"] > MIN_SECONDS_DELTA:
+            regressions.append(f"{key}: {base['seconds'] * 1000:.1f} ms -> {now['seconds'] * 1000:.1f} ms")
+        if now["peak_kb"] > base["peak_kb"] * (1 + tolerance) and now["peak_kb"] - base["peak_kb"] > MIN_PEAK_DELTA_KB:
+            regressions.append(f"{key}: peak {base['peak_kb']:.0f} KB -> {now['peak_kb']:.0f} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless exam engine benchmarks")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated bank sizes (default %(default)s)")
+    parser.add_argument('--exam-size', type=int, default=200, help="questions per benchmarked exam")
+    parser.add_argument('--pdf-pages', type=int, default=100)
+    parser.add_argument('--gen-questions', type=int, default=50)
+    parser.add_argument('--stub-delay', type=float, default=0.05, help="seconds per stubbed model call")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed relative slowdown/growth (default %(default)s)")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+
+    server, base = gemini_stub.start_stub_server(delay=args.stub_delay)
+    gemini_client.API_BASE = base
+
+    timings = run_suite(False, sizes, args.exam_size, args.pdf_pages, args.gen_questions)
+    tracemalloc.start()
+    peaks = run_suite(True, sizes, args.exam_size, args.pdf_pages, args.gen_questions)
+    tracemalloc.stop()
+    server.shutdown()
+    results = {key: {**timings[key], **peaks.get(key, {})} for key in timings}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get("results", {})
+    print(f"{'operation':<40} {'ms':>10} {'peak KB':>10} {'base ms':>10}")
+    for key, r in results.items():
+        base_ms = f"{baseline[key]['seconds'] * 1000:.1f}" if key in baseline else "-"
+        print(f"{key:<40} {r['seconds'] * 1000:>10.1f} {r['peak_kb']:>10.0f} {base_ms:>10}")
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import random
+
+# Synthetic inputs for the benchmarks: question banks in both supported
+# schemas, and minimal text PDFs, generated without any extra dependency.
+
+_WORDS = ("vasculitis arthritis nephritis lupus antibody complement biopsy renal cardiac "
+          "pulmonary hepatic serum marker therapy steroid dose infusion syndrome fever rash "
+          "joint cell receptor cytokine pathway gene mutation inherited acquired chronic acute").split()
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+
+def options_question(i, rng, categories=10):
+    options = [f"{_sentence(rng, 4)} ({i}.{k})" for k in range(4)]
+    return {
+        "question": f"Q{i}: {_sentence(rng, 18)}?",
+        "options": options,
+        "correct_answer": options[i % 4],
+        "rationale": _sentence(rng, 25),
+        "category": f"Category {i % categories}",
+    }
+
+
+def answer_options_question(i, rng, categories=10):
+    return {
+        "question": f"Q{i}: {_sentence(rng, 18)}?",
+        "answerOptions": [
+            {"text": f"{_sentence(rng, 4)} ({i}.{k})", "isCorrect": k == i % 4, "rationale": _sentence(rng, 12)}
+            for k in range(4)
+        ],
+        "hint": _sentence(rng, 6),
+        "category": f"Category {i % categories}",
+    }
+
+
+def make_bank(size, schema="options", seed=0):
+    rng = random.Random(seed)
+    build = options_question if schema == "options" else answer_options_question
+    return [build(i, rng) for i in range(size)]
+
+
+def make_pdf(pages_text):
+    # One Helvetica text page per string; enough structure for PyPDF2.
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages_text)))
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages_text)} >>".encode())
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages_text):
+        clean = text.replace('\\', '').replace('(', '').replace(')', '')
+        lines = [clean[j:j + 90] for j in range(0, len(clean), 90)] or [""]
+        stream = ("BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET").encode('latin-1', 'replace')
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (i + 1) + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return out
+
+
+def make_pdf_pages(count, words_per_page=400, seed=0):
+    rng = random.Random(seed)
+    return make_pdf([_sentence(rng, words_per_page) for _ in range(count)])
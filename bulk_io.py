@@ -0,0 +1,207 @@
+import argparse
+import csv
+import io
+import json
+import os
+
+import storage
+from question_model import parse_question
+
+# Bulk import and export of question sets as JSON (an array), JSON Lines or
+# CSV. Imports are streamed: records are parsed one at a time, validated and
+# normalized through parse_question, and written to the bank in batches
+# of IMPORT_BATCH, so memory stays flat however large the file is. A bad
+# record is reported with its row number and skipped; the rest still import.
+#
+# CSV columns: question, option_1 ... option_N (or one "options" column with
+# a JSON array or "|"-separated options), correct_answer, rationale, hint,
+# category. The answer may be the option text, its letter or a 0-based index;
+# a number that is also the text of an option means that option.
+#
+#   python bulk_io.py import question_bank.json
+#   python bulk_io.py export bank.csv
+
+FORMATS = ('json', 'jsonl', 'csv')
+IMPORT_BATCH = 1000
+MAX_REPORTED_ERRORS = 1000  # rows beyond this are only counted
+MAX_CSV_FIELD = 16 * 1024 * 1024  # characters; the csv module's default is 128 KiB
+CSV_FIELDS = ('question', 'correct_answer', 'rationale', 'hint', 'category')
+
+csv.field_size_limit(MAX_CSV_FIELD)
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    if ext == 'ndjson':
+        return 'jsonl'
+    if ext not in FORMATS:
+        raise ValueError(f"unsupported file type .{ext} (use {', '.join(FORMATS)})")
+    return ext
+
+
+def _csv_raw(row):
+    raw = {field: (row.get(field) or '').strip() for field in CSV_FIELDS}
+    options = row.get('options')
+    if options:
+        options = options.strip()
+        raw['options'] = json.loads(options) if options.startswith('[') else [o.strip() for o in options.split('|')]
+    else:
+        raw['options'] = [v.strip() for k, v in row.items() if k and k.startswith('option') and v and v.strip()]
+    answer = raw['correct_answer']
+    if answer.isdigit():
+        raw['correct_answer'] = int(answer) # Still matched against the option text first
+    return raw
+
+
+def iter_records(f, fmt):
+    # (row number, raw dict or None, error or None) from a text file object.
+    # Row numbers are 1-based: array position, line number or CSV data row.
+    if fmt == 'json':
+        try:
+            for row, raw in enumerate(storage.iter_json_array(f), 1):
+                yield row, raw, None
+        except ValueError as e:
+            # The array itself is broken; nothing after this point can be read
+            yield None, None, str(e)
+    elif fmt == 'jsonl':
+        for row, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield row, json.loads(line), None
+            except ValueError as e:
+                yield row, None, f"invalid JSON: {e}"
+    else:
+        reader, row = csv.DictReader(f), 0
+        while True:
+            row += 1
+            try:
+                fields = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # e.g. an overlong field; the reader carries on with the next line
+                yield row, None, f"unreadable CSV row: {e}"
+                continue
+            try:
+                yield row, _csv_raw(fields), None
+            except ValueError as e:
+                yield row, None, f"invalid options column: {e}"
+
+
+class ImportReport:
+    __slots__ = ('rows', 'imported', 'added', 'errors', 'error_count')
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0  # valid questions, new or merged into a stored one
+        self.added = 0  # of those, new to the bank
+        self.errors = []  # (row number, message), the first MAX_REPORTED_ERRORS
+        self.error_count = 0
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row, message))
+
+    def errors_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(('row', 'error'))
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+def import_questions(f, fmt, store, category=None, progress=None):
+    # Streams f into store; progress(report) is called after every batch.
+    report = ImportReport()
+
+    def flush(batch):
+        before = len(store)
+        stored = store.add_many(batch)
+        report.imported += len(stored)
+        report.added += len(store) - before
+        if progress:
+            progress(report)
+
+    batch = []
+    for row, raw, err in iter_records(f, fmt):
+        if row is not None:
+            report.rows += 1
+        if err is None:
+            try:
+                q = parse_question(raw)
+            except ValueError as e:
+                err = str(e)
+        if err is not None:
+            report.error(row, err)
+            continue
+        batch.append(q if q.category or not category else q.replace(category=category))
+        if len(batch) >= IMPORT_BATCH:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
+
+
+def import_upload(uploaded, store, **kwargs):
+    # st.file_uploader file (or any binary file object with a name), decoded
+    # as it is read instead of all at once
+    text = io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+    try:
+        return import_questions(text, detect_format(uploaded.name), store, **kwargs)
+    finally:
+        text.detach()
+
+
+def _csv_row(q, width):
+    options = list(q.options) + [''] * (width - len(q.options))
+    return [q.text, *options, q.correct_answer or '', q.rationale or '', q.hint or '', q.category or '']
+
+
+def export_questions(questions, f, fmt):
+    # Writes questions (an iterable) to a text file object, one at a time
+    if fmt == 'jsonl':
+        for q in questions:
+            f.write(storage.dumps(q.to_dict()) + "\n")
+    elif fmt == 'json':
+        f.write("[")
+        for i, q in enumerate(questions):
+            f.write(("," if i else "") + "\n" + storage.dumps(q.to_dict()))
+        f.write("\n]\n")
+    else:
+        questions = list(questions)
+        width = max((len(q.options) for q in questions), default=0)
+        writer = csv.writer(f)
+        writer.writerow(['question', *(f"option_{i + 1}" for i in range(width)), *CSV_FIELDS[1:]])
+        writer.writerows(_csv_row(q, width) for q in questions)
+
+
+def export_bytes(questions, fmt):
+    out = io.StringIO()
+    export_questions(questions, out, fmt)
+    return out.getvalue().encode('utf-8')
+
+
+if __name__ == "__main__":
+    import question_store
+
+    parser = argparse.ArgumentParser(description="Bulk question import/export")
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('path', help="a .json, .jsonl or .csv file")
+    parser.add_argument('--category', help="category for imported questions that have none")
+    args = parser.parse_args()
+    store = question_store.QuestionStore()
+    fmt = detect_format(args.path)
+    if args.action == 'import':
+        with open(args.path, 'r', encoding='utf-8-sig', newline='') as f:
+            report = import_questions(f, fmt, store, args.category,
+                                      progress=lambda r: print(f"  {r.imported} questions imported...", end="\r"))
+        print(f"{report.rows} records: {report.imported} imported ({report.added} new), {report.error_count} rejected")
+        for row, message in report.errors[:20]:
+            print(f"  row {row}: {message}")
+    else:
+        with open(args.path, 'w', encoding='utf-8', newline='') as f:
+            export_questions(store.questions(), f, fmt)
+        print(f"{len(store)} questions exported to {args.path}")
@@ -0,0 +1,84 @@
+import random
+
+from question_store import UNCATEGORIZED
+
+# Custom exams assembled from the bank: filter by category and by what the
+# user has done with a question before, then sample a stratified subset so
+# every chosen category keeps its share of the exam.
+#
+# What has been seen or missed comes from the per-question analytics, which
+# are kept current on every submit, so building an exam never has to look at
+# past records.
+
+SOURCE_ALL = "all"
+SOURCE_UNSEEN = "unseen"
+SOURCE_WRONG = "wrong"
+SOURCE_DUE = "due"
+
+SOURCE_LABELS = {
+    SOURCE_ALL: "All questions",
+    SOURCE_UNSEEN: "Never seen",
+    SOURCE_WRONG: "Previously answered wrong",
+    SOURCE_DUE: "Due for review",
+}
+
+
+def filter_ids(ids, source, analytics):
+    if source == SOURCE_UNSEEN:
+        return [qid for qid in ids if qid not in analytics]
+    if source == SOURCE_WRONG:
+        return [qid for qid in ids if analytics.still_wrong(qid)]
+    return list(ids)
+
+
+def due_pools(store, scheduler, categories, limit=None):
+    # The limit most overdue questions, grouped by category, most overdue first
+    # within each; the scheduler stops at limit instead of collecting every due one.
+    pools = {cat: [] for cat in categories}
+    def category_of(qid):
+        return store.get(qid).category or UNCATEGORIZED
+    for qid in scheduler.due(limit, accept=lambda qid: category_of(qid) in pools):
+        pools[category_of(qid)].append(qid)
+    return pools
+
+
+def candidate_pools(store, analytics, categories, source, scheduler=None, limit=None):
+    # limit is the exam size; only the due source needs it to bound its work.
+    if source == SOURCE_DUE:
+        return due_pools(store, scheduler, categories, limit)
+    return {cat: filter_ids(store.ids_in_category(cat), source, analytics) for cat in categories}
+
+
+def allocate(target, pool_sizes):
+    # Largest-remainder split of target over the pools, proportional to their
+    # size and never more than a pool holds.
+    available = sum(pool_sizes.values())
+    if target >= available:
+        return dict(pool_sizes)
+    quotas, remainders = {}, []
+    for cat, size in pool_sizes.items():
+        share = target * size / available
+        quotas[cat] = int(share)
+        remainders.append((share - int(share), size, cat))
+    left = target - sum(quotas.values())
+    for _, _, cat in sorted(remainders, reverse=True)[:left]:
+        quotas[cat] += 1
+    return quotas
+
+
+def build_exam(pools, size, source=SOURCE_ALL, rng=random):
+    # pools from candidate_pools; returns question IDs in random order. Due
+    # questions are taken most overdue first instead of at random.
+    quotas = allocate(size, {cat: len(pool) for cat, pool in pools.items()})
+    picked = []
+    for cat, count in quotas.items():
+        picked.extend(pools[cat][:count] if source == SOURCE_DUE else rng.sample(pools[cat], count))
+    rng.shuffle(picked)
+    return picked
+
+
+def search_exam(store, query, size, rng=random):
+    # The best size matches of a bank search, in random order
+    ids, _ = store.search(query, size)
+    rng.shuffle(ids)
+    return ids
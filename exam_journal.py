@@ -0,0 +1,118 @@
+import os
+import threading
+import uuid
+
+import storage
+from exam_session import ExamSession
+from profiling import traced
+
+# Autosave for exams in progress. Starting an exam appends one line with its
+# question IDs and timer; every Save/Mark/Clear appends one small delta with
+# the state of the question just answered. Replaying an exam's lines rebuilds
+# its ExamSession, so a browser refresh or server restart loses at most the
+# question on screen. The file is removed once no journaled exam is open.
+#
+#   {"x": exam, "t": "start", "ids": [...], "spq": 60, "started": ..., "deadline": ...}
+#   {"x": exam, "i": 12, "s": 1, "r": 2, "g": 0, "d": 41.3, "c": 13}
+#   {"x": exam, "t": "extend", "ids": [...]}
+#   {"x": exam, "t": "end"}
+
+JOURNAL_FILE = "local_exam_journal.jsonl"
+
+
+def new_exam_id():
+    return uuid.uuid4().hex[:12]
+
+
+class ExamJournal:
+    # Shared by every session; keeps a small summary of each open exam.
+
+    def __init__(self, filepath=JOURNAL_FILE):
+        self.filepath = filepath
+        self._open = {}  # exam id -> {"started", "total", "answered": set of indexes}
+        self._lock = threading.Lock()
+        for entry in storage.iter_jsonl(filepath):
+            self._apply_summary(entry)
+
+    def _apply_summary(self, entry):
+        exam_id, kind = entry.get('x'), entry.get('t')
+        if kind == 'start':
+            self._open[exam_id] = {"started": entry.get('started'), "total": len(entry['ids']), "answered": set()}
+            return
+        summary = self._open.get(exam_id)
+        if summary is None:
+            return
+        if kind == 'end':
+            del self._open[exam_id]
+        elif kind == 'extend':
+            summary['total'] += len(entry['ids'])
+        elif entry.get('r', -1) >= 0:
+            summary['answered'].add(entry['i'])
+        else:
+            summary['answered'].discard(entry['i'])
+
+    @traced("ExamJournal.append")
+    def _append(self, entry):
+        with self._lock:
+            storage.append_jsonl([entry], self.filepath)
+            self._apply_summary(entry)
+
+    def start(self, exam_id, question_ids, exam):
+        self._append({"x": exam_id, "t": "start", "ids": list(question_ids), "spq": exam.seconds_per_q,
+                      "started": exam.started_at, "deadline": exam.deadline})
+
+    def record(self, exam_id, idx, exam, current):
+        self._append({"x": exam_id, "i": idx, "s": exam.status(idx), "r": exam.responses[idx],
+                      "g": exam.guesses[idx], "d": round(exam.dwell[idx], 1), "c": current})
+
+    def extend(self, exam_id, question_ids):
+        self._append({"x": exam_id, "t": "extend", "ids": list(question_ids)})
+
+    @traced("ExamJournal.finish")
+    def finish(self, exam_id):
+        # Submitted or discarded; the journal goes away with the last open exam
+        with self._lock:
+            if exam_id not in self._open:
+                return
+            del self._open[exam_id]
+            if self._open:
+                storage.append_jsonl([{"x": exam_id, "t": "end"}], self.filepath)
+            elif os.path.exists(self.filepath):
+                os.remove(self.filepath)
+
+    def open_exams(self):
+        # [(exam id, started timestamp, total, answered)] newest first
+        with self._lock:
+            exams = [(exam_id, s['started'], s['total'], len(s['answered'])) for exam_id, s in self._open.items()]
+        return sorted(exams, key=lambda e: e[1] or 0, reverse=True)
+
+    @traced("ExamJournal.replay")
+    def replay(self, exam_id):
+        # (question IDs, ExamSession, current index), or None if the exam is not open
+        ids, exam, current = None, None, 0
+        for entry in storage.iter_jsonl(self.filepath):
+            if entry.get('x') != exam_id:
+                continue
+            kind = entry.get('t')
+            if kind == 'start':
+                ids = list(entry['ids'])
+                exam = ExamSession(len(ids), entry.get('spq', 0))
+                exam.started_at = entry.get('started') or exam.started_at
+                exam.deadline = entry.get('deadline')
+            elif exam is None:
+                continue
+            elif kind == 'extend':
+                ids.extend(entry['ids'])
+                exam.extend(len(entry['ids']))
+            elif kind == 'end':
+                return None
+            elif 0 <= entry['i'] < len(ids):
+                i = entry['i']
+                exam.set_status(i, entry['s'])
+                exam.set_response(i, None if entry['r'] < 0 else entry['r'])
+                exam.set_guess(i, entry['g'])
+                exam.dwell[i] = entry.get('d', 0.0)
+                current = min(entry.get('c', i), len(ids) - 1)
+        if exam is None:
+            return None
+        return ids, exam, current
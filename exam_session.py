@@ -0,0 +1,133 @@
+import time
+from array import array
+
+from question_model import response_index
+
+# Compact per-exam state: one byte per question for status and guess flag,
+# one signed byte for the chosen option (-1 = no response), and running
+# counts per status so the legend never has to rescan the exam.
+#
+# Timed exams carry a wall-clock deadline (seconds_per_q per question), and
+# every exam accumulates per-question dwell time: enter() charges the time
+# since the last question switch to the question being left.
+
+NOT_VISITED = 0
+ANSWERED = 1
+NOT_ANSWERED = 2
+MARKED = 3
+ANSWERED_MARKED = 4
+
+NO_RESPONSE = -1
+
+WIDGET_KEY_PREFIXES = ("radio_", "guess_cb_")
+
+
+class ExamSession:
+    __slots__ = ('statuses', 'guesses', 'responses', 'counts', 'dwell', 'current', 'entered_at',
+                 'started_at', 'seconds_per_q', 'deadline')
+
+    def __init__(self, total, seconds_per_q=0):
+        self.statuses = bytearray(total)
+        self.guesses = bytearray(total)
+        self.responses = array('b', [NO_RESPONSE]) * total
+        self.counts = [total, 0, 0, 0, 0]
+        self.dwell = array('d', [0.0]) * total
+        self.current = None
+        self.entered_at = 0.0
+        self.started_at = time.time()
+        self.seconds_per_q = seconds_per_q
+        self.deadline = self.started_at + seconds_per_q * total if seconds_per_q else None
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def status(self, idx):
+        return self.statuses[idx]
+
+    def set_status(self, idx, status):
+        old = self.statuses[idx]
+        if old != status:
+            self.counts[old] -= 1
+            self.counts[status] += 1
+            self.statuses[idx] = status
+
+    def visit(self, idx):
+        if self.statuses[idx] == NOT_VISITED:
+            self.set_status(idx, NOT_ANSWERED)
+
+    def response(self, idx):
+        ans = self.responses[idx]
+        return None if ans == NO_RESPONSE else ans
+
+    def set_response(self, idx, ans):
+        self.responses[idx] = NO_RESPONSE if ans is None else ans
+
+    def is_guess(self, idx):
+        return bool(self.guesses[idx])
+
+    def set_guess(self, idx, flag):
+        self.guesses[idx] = 1 if flag else 0
+
+    def enter(self, idx):
+        # idx=None stops the clock (on submit)
+        now = time.monotonic()
+        if self.current is not None:
+            self.dwell[self.current] += now - self.entered_at
+        self.current = idx
+        self.entered_at = now
+
+    def expired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def extend(self, count):
+        # More questions appended to a running exam
+        self.statuses.extend(bytes(count))
+        self.guesses.extend(bytes(count))
+        self.responses.extend(array('b', [NO_RESPONSE]) * count)
+        self.counts[NOT_VISITED] += count
+        self.dwell.extend(array('d', [0.0]) * count)
+        if self.deadline is not None:
+            self.deadline += self.seconds_per_q * count
+
+    def responses_dict(self):
+        # Sparse form for the history record
+        return {i: ans for i, ans in enumerate(self.responses) if ans != NO_RESPONSE}
+
+    def guesses_dict(self):
+        return {i: True for i, flag in enumerate(self.guesses) if flag}
+
+    def dwell_list(self):
+        # Seconds per question, to a tenth of a second
+        return [round(t, 1) for t in self.dwell]
+
+    @classmethod
+    def from_record(cls, total, responses, guesses):
+        # responses/guesses as stored in a record (JSON string keys) or as dicts
+        session = cls(total)
+        for k, ans in responses.items():
+            i = int(k)
+            if ans is not None and 0 <= i < total:
+                session.set_response(i, ans)
+                session.set_status(i, ANSWERED)
+        for k, flag in guesses.items():
+            i = int(k)
+            if flag and 0 <= i < total:
+                session.set_guess(i, True)
+        return session
+
+    @classmethod
+    def from_history(cls, record, questions):
+        # JSON turns the integer question indexes into string keys, and older
+        # records store the chosen option's text instead of its index
+        responses = {}
+        for k, v in record.get('responses', {}).items():
+            if int(k) < len(questions):
+                responses[int(k)] = response_index(questions[int(k)], v)
+        return cls.from_record(len(questions), responses, record.get('guesses', {}))
+
+
+def clear_widget_keys(state):
+    # Per-question widget keys from an earlier exam would otherwise stay in
+    # session state for the life of the browser session.
+    for key in [k for k in state.keys() if isinstance(k, str) and k.startswith(WIDGET_KEY_PREFIXES)]:
+        del state[key]
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from profiling import traced
+
+# Thin client for the Gemini REST API. One pooled requests.Session is shared
+# by every generation (no fresh TLS handshake per call), the model picked for
+# an API key is remembered for MODEL_CACHE_TTL seconds, and every request has
+# a bounded timeout with retry + exponential backoff on transient failures.
+#
+# Set GEMINI_API_BASE (e.g. to the gemini_stub.py server) to run offline.
+
+API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+MODEL_CACHE_TTL = 60 * 60
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+
+# Prioritizing the newest flash/pro models
+MODEL_PREFERENCES = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
+
+
+class GeminiError(Exception):
+    def __init__(self, message, detail=None):
+        super().__init__(message)
+        self.message = message
+        self.detail = detail
+
+
+_session = None
+_session_lock = threading.Lock()
+_model_cache = {}  # sha256(api key) -> (model name, expiry timestamp)
+_model_cache_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _key_hash(api_key):
+    # Never keep raw API keys around as dict keys
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def pick_model(valid_models):
+    for pref in MODEL_PREFERENCES:
+        for vm in valid_models:
+            if pref in vm:
+                return vm
+    return valid_models[0] # Fallback to whatever is first
+
+
+@traced("gemini.resolve_model")
+def resolve_model(api_key):
+    # Dynamically ask Google which models this specific API key has access to,
+    # at most once per MODEL_CACHE_TTL.
+    key_hash = _key_hash(api_key)
+    now = time.time()
+    with _model_cache_lock:
+        cached = _model_cache.get(key_hash)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    try:
+        list_resp = get_session().get(
+            f"{API_BASE}/models", params={'key': api_key},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+    except requests.exceptions.RequestException as e:
+        raise GeminiError(f"Failed to authenticate or fetch allowed models. Error: {e}")
+    if list_resp.status_code == 400:
+        raise GeminiError("Your API Key is invalid. Please check it and try again.")
+    if not list_resp.ok:
+        raise GeminiError(f"Failed to authenticate or fetch allowed models. Error: HTTP {list_resp.status_code}", list_resp.text)
+
+    # Filter for models that actually support text generation
+    valid_models = [
+        m['name'].replace('models/', '')
+        for m in list_resp.json().get('models', [])
+        if 'generateContent' in m.get('supportedGenerationMethods', [])
+    ]
+    if not valid_models:
+        raise GeminiError("Your API key does not have access to any text generation models in your region.")
+
+    chosen_model = pick_model(valid_models)
+    with _model_cache_lock:
+        _model_cache[key_hash] = (chosen_model, now + MODEL_CACHE_TTL)
+    return chosen_model
+
+
+def forget_model(api_key):
+    with _model_cache_lock:
+        _model_cache.pop(_key_hash(api_key), None)
+
+
+@traced("gemini.generate_text")
+def generate_text(api_key, prompt, temperature=0.7):
+    # Returns (model name, response text).
+    chosen_model = resolve_model(api_key)
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": temperature}
+    }
+    try:
+        response = get_session().post(
+            f"{API_BASE}/models/{chosen_model}:generateContent", params={'key': api_key},
+            json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+    except requests.exceptions.RequestException as e:
+        raise GeminiError(f"An unexpected error occurred: {e}")
+    if not response.ok:
+        if response.status_code == 404:
+            # The cached model may have been retired; re-discover next time
+            forget_model(api_key)
+        raise GeminiError(f"Failed to generate questions. The model '{chosen_model}' rejected the request.", response.text)
+
+    result = response.json()
+    if not result.get('candidates'):
+        raise GeminiError("The AI returned an empty response. Please try again.")
+    try:
+        return chosen_model, result['candidates'][0]['content']['parts'][0]['text'].strip()
+    except (KeyError, IndexError, TypeError):
+        raise GeminiError("The AI returned an empty response. Please try again.")
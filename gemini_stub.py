@@ -0,0 +1,87 @@
+import argparse
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline stand-in for the two Gemini endpoints the app uses (model listing
+# and generateContent). It answers every prompt with synthetic MCQs, so the
+# client, the generation flow and the benchmarks can run without network.
+#
+#   python gemini_stub.py --port 8765
+#   GEMINI_API_BASE=http://127.0.0.1:8765/v1beta streamlit run app_exam.py
+
+STUB_MODELS = ['gemini-2.5-flash', 'embedding-001']
+_COUNT = re.compile(r'Create (\d+) multiple-choice')
+_TOPIC = re.compile(r'on the topic: "([^"]*)"')
+
+
+def fake_questions(count, topic, salt=""):
+    return [
+        {
+            "question": f"[{topic}] Stub question {salt}{i + 1}: which option is correct?",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correct_answer": "Option B",
+            "rationale": "Generated by the offline Gemini stub.",
+        }
+        for i in range(count)
+    ]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.split('?')[0].endswith('/models'):
+            self._send(200, {"models": [
+                {"name": f"models/{name}", "supportedGenerationMethods": ["embedContent"] if 'embedding' in name else ["generateContent"]}
+                for name in STUB_MODELS
+            ]})
+        else:
+            self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if ':generateContent' not in self.path:
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        prompt = body['contents'][0]['parts'][0]['text']
+        count = _COUNT.search(prompt)
+        topic = _TOPIC.search(prompt)
+        if self.delay:
+            threading.Event().wait(self.delay)
+        questions = fake_questions(int(count.group(1)) if count else 5, topic.group(1) if topic else "topic", salt=f"{abs(hash(prompt)) % 10000}-")
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": json.dumps(questions)}]}}]})
+
+
+def start_stub_server(port=0, delay=0.0):
+    # Runs in a daemon thread; returns (server, base URL for GEMINI_API_BASE).
+    handler = type('Handler', (StubHandler,), {'delay': delay})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Gemini API stub")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait before each generateContent reply")
+    args = parser.parse_args()
+    server, base = start_stub_server(args.port, args.delay)
+    print(f"Gemini stub listening; set GEMINI_API_BASE={base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,164 @@
+import json
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import gemini_client
+import generation_cache
+from question_model import parse_questions
+
+# Question generation split into concurrent batches. A GenerationJob submits
+# one request per batch to a shared thread pool; the caller blocks only until
+# the first batch lands (so the exam can start), then polls for the rest and
+# appends them to the running exam as they arrive. Every batch is parsed and
+# validated on arrival.
+
+BATCH_SIZE = 10
+MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="qgen")
+
+_JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+
+
+def build_prompt(topic, num_q, context="", batch_no=1, batches=1):
+    variety = ""
+    if batches > 1:
+        variety = f"This is batch {batch_no} of {batches} for the same exam; cover aspects other batches are unlikely to pick, and do not repeat classic textbook questions verbatim."
+    return f"""
+    You are an expert medical examiner for the INI SS (super-specialty) exam.
+    Create {num_q} multiple-choice questions on the topic: "{topic}".
+    If context text is provided below, base the questions on that text.
+    {variety}
+
+    Context Text: {context}
+
+    CRITICAL INSTRUCTION: Your response MUST be ONLY a valid JSON array. Do not include any markdown formatting or extra text.
+    Format exactly like this:
+    [
+      {{
+        "question": "Question text here?",
+        "options": ["Option A", "Option B", "Option C", "Option D"],
+        "correct_answer": "Option B",
+        "rationale": "Explanation here."
+      }}
+    ]
+    """
+
+
+def parse_reply(raw_text):
+    # Smart cleanup using regex to find the JSON array
+    match = _JSON_ARRAY.search(raw_text)
+    if match:
+        raw_text = match.group(0)
+    try:
+        raws = json.loads(raw_text)
+    except json.JSONDecodeError:
+        raise gemini_client.GeminiError("The AI returned improperly formatted data. Please try generating again.")
+    try:
+        questions, _ = parse_questions(raws)
+    except ValueError:
+        questions = []
+    if not questions:
+        raise gemini_client.GeminiError("The AI returned improperly formatted data. Please try generating again.")
+    return questions
+
+
+def _drop_known(questions, is_known):
+    if is_known is None:
+        return questions, 0
+    fresh = [q for q in questions if not is_known(q)]
+    return fresh, len(questions) - len(fresh)
+
+
+def generate_batch(api_key, topic, num_q, context="", batch_no=1, batches=1, is_known=None):
+    # Returns (questions, number dropped as already known). A fresh cached reply
+    # for the same prompt and model is used instead of a model call, unless
+    # everything in it is already known, in which case the model is asked again.
+    prompt = build_prompt(topic, num_q, context, batch_no, batches)
+    model = gemini_client.resolve_model(api_key)
+    cached = generation_cache.get(prompt, model)
+    if cached is not None:
+        try:
+            questions, dropped = _drop_known(parse_reply(cached), is_known)
+            if questions:
+                return questions, dropped
+        except gemini_client.GeminiError:
+            pass
+    model, raw_text = gemini_client.generate_text(api_key, prompt)
+    questions = parse_reply(raw_text)
+    generation_cache.put(prompt, model, raw_text)
+    return _drop_known(questions, is_known)
+
+
+def split_batches(num_q, batch_size=BATCH_SIZE):
+    sizes = [batch_size] * (num_q // batch_size)
+    if num_q % batch_size:
+        sizes.append(num_q % batch_size)
+    return sizes
+
+
+class GenerationJob:
+    def __init__(self, api_key, topic, num_q, plan=None, is_known=None):
+        # plan: (question count, context text) per batch; default is topic-only batches
+        # plan may be a lazy generator (e.g. a PDF still being read); each batch
+        # is submitted as soon as it is produced. is_known(question) filters out
+        # questions the bank already has before they are returned.
+        if plan is None:
+            plan = [(size, "") for size in split_batches(num_q)]
+        expected = len(split_batches(num_q))
+        self.topic = topic
+        self.total_batches = 0
+        self.delivered_batches = 0
+        self.dropped = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._pending = set()
+        for batch_no, (size, context) in enumerate(plan, 1):
+            self._pending.add(_executor.submit(
+                generate_batch, api_key, topic, size, context, batch_no, max(expected, batch_no), is_known,
+            ))
+            self.total_batches = batch_no
+
+    @property
+    def done(self):
+        return not self._pending
+
+    def _collect(self, finished):
+        batches = []
+        for future in finished:
+            self._pending.discard(future)
+            if future.cancelled():
+                continue
+            err = future.exception()
+            if err is None:
+                questions, dropped = future.result()
+                batches.append(questions)
+                self.dropped += dropped
+                self.delivered_batches += 1
+            else:
+                self.errors.append(err if isinstance(err, gemini_client.GeminiError) else gemini_client.GeminiError(f"An unexpected error occurred: {err}"))
+        return [q for batch in batches for q in batch]
+
+    def wait_first(self, timeout=None):
+        # Blocks until at least one batch produced questions, or every batch failed.
+        with self._lock:
+            while self._pending:
+                finished, _ = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not finished:
+                    return []
+                questions = self._collect(finished)
+                if questions:
+                    return questions
+            return []
+
+    def poll(self):
+        # Non-blocking: questions from batches that finished since the last call.
+        with self._lock:
+            finished = [f for f in self._pending if f.done()]
+            return self._collect(finished)
+
+    def cancel(self):
+        with self._lock:
+            for future in self._pending:
+                future.cancel()
@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Local cache of raw model replies, keyed by a fingerprint of the exact prompt
+# plus the model that answered it. A repeated request (same topic, PDF chunk
+# and question count) is served from disk instead of a model round trip as
+# long as the entry is younger than FRESHNESS_SECONDS. Set GEN_CACHE_TTL
+# (seconds) to change that; 0 disables the cache.
+
+CACHE_DIR = ".gen_cache"
+FRESHNESS_SECONDS = int(os.environ.get("GEN_CACHE_TTL", 7 * 24 * 60 * 60))
+
+
+def fingerprint(prompt, model):
+    return hashlib.sha256(f"{model}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+def _path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def get(prompt, model, cache_dir=CACHE_DIR, max_age=None):
+    max_age = FRESHNESS_SECONDS if max_age is None else max_age
+    if max_age <= 0:
+        return None
+    try:
+        with open(_path(fingerprint(prompt, model), cache_dir), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('created', 0) > max_age:
+        return None
+    return entry.get('text')
+
+
+def put(prompt, model, text, cache_dir=CACHE_DIR):
+    if FRESHNESS_SECONDS <= 0:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(fingerprint(prompt, model), cache_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")  # unique per writer, threads included
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump({"created": time.time(), "model": model, "text": text}, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
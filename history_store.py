@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+
+import storage
+from profiling import traced
+
+# Append-only exam history: one JSON record per line, oldest first.
+# A submit only ever appends one line, so its cost does not grow with the
+# size of the history, and a crash can at worst leave a torn final line,
+# which is skipped on load instead of wiping out the whole file.
+
+HISTORY_FILE = "local_history.jsonl"
+LEGACY_HISTORY_FILE = "local_history.json"
+SUMMARY_FIELDS = ('id', 'date', 'score', 'total')
+
+
+def append_record(record, filepath=HISTORY_FILE):
+    storage.append_jsonl([record], filepath)
+
+
+def migrate_legacy_history(legacy_path=LEGACY_HISTORY_FILE, filepath=HISTORY_FILE):
+    # One-time conversion of the old newest-first JSON array into the JSONL log.
+    # The array is streamed into a scratch file, whose lines are then copied
+    # out in reverse, so only one record at a time is held in memory.
+    # The old file is kept as a .bak copy so nothing is lost if this goes wrong.
+    if os.path.exists(filepath) or not os.path.exists(legacy_path):
+        return False
+    scratch_path = f"{filepath}.migrating"
+    offsets = []
+    try:
+        with open(scratch_path, 'w+b') as scratch:
+            for rec in storage.iter_legacy_json(legacy_path):
+                offsets.append(scratch.tell())
+                scratch.write(storage.dumps(rec).encode('utf-8') + b"\n")
+
+            def oldest_first():
+                for offset in reversed(offsets):
+                    scratch.seek(offset)
+                    yield scratch.readline().decode('utf-8').rstrip("\n")
+
+            storage.atomic_write_lines(oldest_first(), filepath)
+    except (OSError, ValueError):
+        return False # Unreadable old file: leave it in place, start with no history
+    finally:
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+    os.replace(legacy_path, f"{legacy_path}.bak")
+    return True
+
+
+def summarize(record, offset, length):
+    summary = {f: record.get(f) for f in SUMMARY_FIELDS}
+    summary['offset'] = offset
+    summary['length'] = length
+    return summary
+
+
+def scan_summaries(filepath, start=0):
+    # Summaries of every intact record line from byte offset start on.
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None # Torn write; skipped like in storage.iter_jsonl
+                if isinstance(record, dict):
+                    yield summarize(record, offset, len(line))
+            offset += len(line)
+
+
+class HistoryStore:
+    # Shared by every browser session in the process. Only a small summary per
+    # record (date, score, byte offset) is kept in memory, from an index file
+    # next to the history that is appended to on every submit; a full record
+    # is read from disk when it is opened. Appends are serialized so two
+    # sessions submitting at the same time cannot interleave their lines.
+
+    @traced("HistoryStore.load_index")
+    def __init__(self, filepath=HISTORY_FILE, legacy_path=LEGACY_HISTORY_FILE, index_path=None):
+        self.filepath = filepath
+        self.index_path = index_path or f"{filepath}.idx"
+        if migrate_legacy_history(legacy_path, filepath) and os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self._summaries = self._load_index() # Oldest first, like the file
+        self._lock = threading.Lock()
+
+    @traced("HistoryStore.read")
+    def _read(self, summaries):
+        if not summaries:
+            return [] # The history file may not exist yet
+        with open(self.filepath, 'rb') as f:
+            records = []
+            for summary in summaries:
+                f.seek(summary['offset'])
+                records.append(json.loads(f.read(summary['length'])))
+            return records
+
+    def _indexed(self, summaries):
+        # The index still matches the file if it ends inside it and its first and
+        # last entries point at those records
+        try:
+            last = summaries[-1]
+            if last['offset'] + last['length'] > os.path.getsize(self.filepath):
+                return False
+            ends = [summaries[0], last]
+            return all(r.get('id') == s['id'] for r, s in zip(self._read(ends), ends))
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return False
+
+    def _load_index(self):
+        if not os.path.exists(self.filepath):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path) # Left over from a history that is gone
+            return []
+        summaries = list(storage.iter_jsonl(self.index_path))
+        if summaries and not self._indexed(summaries):
+            summaries = [] # History file was replaced: index it again from scratch
+            os.remove(self.index_path)
+        end = summaries[-1]['offset'] + summaries[-1]['length'] if summaries else 0
+        new = list(scan_summaries(self.filepath, end))
+        storage.append_jsonl(new, self.index_path) # Records appended while the index was behind
+        return summaries + new
+
+    def __len__(self):
+        return len(self._summaries)
+
+    def page(self, page_no, page_size):
+        # [(position, summary)] newest first; positions stay valid across appends.
+        last = len(self._summaries) - 1 - page_no * page_size
+        return [(pos, self._summaries[pos]) for pos in range(last, max(last - page_size, -1), -1)]
+
+    def load(self, pos):
+        return self._read([self._summaries[pos]])[0]
+
+    def records_since(self, count):
+        # Full records, oldest first, after the first count ones.
+        return self._read(self._summaries[count:])
+
+    @traced("HistoryStore.append")
+    def append(self, record):
+        with self._lock:
+            length = len((storage.dumps(record) + "\n").encode('utf-8'))
+            append_record(record, self.filepath)
+            summary = summarize(record, os.path.getsize(self.filepath) - length, length)
+            storage.append_jsonl([summary], self.index_path)
+            self._summaries.append(summary)
@@ -0,0 +1,79 @@
+import re
+import zlib
+
+import numpy as np
+
+# MinHash signatures over word shingles, with LSH banding so that finding
+# near-duplicate questions is a few dict lookups instead of a scan of the
+# bank. Two questions whose shingle sets have an estimated Jaccard
+# similarity of at least THRESHOLD are treated as the same question.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 2
+THRESHOLD = 0.7
+
+_WORD = re.compile(r'\w+')
+
+# Multiply-shift hashing: h -> ((a * h + b) mod 2**64) >> 32 for fixed odd a.
+# uint64 arithmetic wraps, which is exactly the mod 2**64 we want.
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+
+def shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))}
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode('utf-8'))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def signature(text):
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        mixed = (np.multiply.outer(_A, hashes) + _B[:, None]) >> _SHIFT
+    return tuple(mixed.min(axis=1).tolist())
+
+
+def similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class MinHashIndex:
+    def __init__(self):
+        self._signatures = {}
+        # Lists, not sets: safe to read from a worker thread while the main thread appends
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, key, text):
+        if key in self._signatures:
+            return
+        sig = signature(text)
+        self._signatures[key] = sig
+        for band in range(BANDS):
+            self._buckets.setdefault((band, sig[band * ROWS:(band + 1) * ROWS]), []).append(key)
+
+    def find(self, text, threshold=THRESHOLD, accept=None):
+        # Key of the most similar indexed text at or above threshold, else None.
+        # accept(key) can rule candidates out.
+        sig = signature(text)
+        best, best_score = None, threshold
+        seen = set()
+        for band in range(BANDS):
+            for key in self._buckets.get((band, sig[band * ROWS:(band + 1) * ROWS]), ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(sig, self._signatures[key])
+                if score >= best_score and (accept is None or accept(key)):
+                    best, best_score = key, score
+        return best
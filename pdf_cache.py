@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# On-disk cache of extracted PDF page text, keyed by the SHA-256 of the
+# uploaded bytes. A cache entry is a JSONL file: a header line with the page
+# count, then one line per page. Entries are written while the PDF is being
+# extracted (and only published once complete), read back lazily, and evicted
+# least-recently-used first once the cache grows past CACHE_MAX_BYTES.
+
+CACHE_DIR = ".pdf_cache"
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+_READ_BLOCK = 1024 * 1024
+
+
+def file_sha256(f):
+    digest = hashlib.sha256()
+    f.seek(0)
+    for block in iter(lambda: f.read(_READ_BLOCK), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.jsonl")
+
+
+def _read_entry(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        next(f)  # header
+        for line in f:
+            yield json.loads(line)
+
+
+def _write_through(pages, path, total_pages, cache_dir):
+    # Passes pages on unchanged while copying them into the cache entry. The
+    # scratch file is unique, so two sessions extracting the same PDF do not
+    # write (or publish) each other's copy; an abandoned one is removed.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"pages": total_pages}) + "\n")
+            for text in pages:
+                f.write(json.dumps(text) + "\n")
+                yield text
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    evict(cache_dir)
+
+
+def cached_pages(pdf_file, extract, cache_dir=CACHE_DIR):
+    # Returns (total_pages, page text iterator). extract(pdf_file) is only
+    # called on a cache miss and must return (total_pages, page iterator).
+    key = file_sha256(pdf_file)
+    path = _entry_path(key, cache_dir)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                total_pages = json.loads(f.readline())["pages"]
+            os.utime(path)  # mark as recently used
+            return total_pages, _read_entry(path)
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable entry: re-extract and overwrite it
+    os.makedirs(cache_dir, exist_ok=True)
+    total_pages, pages = extract(pdf_file)
+    return total_pages, _write_through(pages, path, total_pages, cache_dir)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.jsonl'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
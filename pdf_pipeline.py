@@ -0,0 +1,125 @@
+import math
+
+import PyPDF2
+
+import generation
+import pdf_cache
+
+# Map-reduce style PDF pipeline: pages are extracted lazily, packed into
+# token-bounded chunks, and the requested number of questions is spread over
+# the whole document by page position. Only chunks that received a quota are
+# kept, so memory is bounded by the number of questions asked for, not by the
+# size of the PDF, and every part of a long document can be covered. Chunks
+# are then packed into requests of up to BATCH_SIZE questions each.
+
+CHARS_PER_TOKEN = 4  # rough estimate for English prose
+CHUNK_TOKENS = 3000
+
+
+def iter_pages(reader):
+    # One page of text at a time; PyPDF2 parses each page on access.
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def iter_chunks(pages, max_tokens=CHUNK_TOKENS):
+    # Yields (start, end, text) where start/end are page positions (end
+    # exclusive, fractional for slices of an oversized page) and text is at
+    # most max_tokens long. Pages are packed whole when they fit.
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    parts, size, first, page_no = [], 0, 0, -1
+    for page_no, text in enumerate(pages):
+        if len(text) > max_chars:
+            if parts:
+                yield first, page_no, "\n".join(parts)
+                parts, size = [], 0
+            slices = (len(text) + max_chars - 1) // max_chars
+            for i in range(slices):
+                yield page_no + i / slices, page_no + (i + 1) / slices, text[i * max_chars:(i + 1) * max_chars]
+            continue
+        if parts and size + len(text) + 1 > max_chars:
+            yield first, page_no, "\n".join(parts)
+            parts, size = [], 0
+        if not parts:
+            first = page_no
+        parts.append(text)
+        size += len(text) + 1
+    if parts:
+        yield first, page_no + 1, "\n".join(parts)
+
+
+def quota_for(start, end, num_q, total_pages):
+    # Questions are anchored at evenly spaced page positions (k + 0.5) * step;
+    # a chunk gets the questions whose anchors fall inside [start, end).
+    if total_pages <= 0 or num_q <= 0:
+        return 0
+    step = total_pages / num_q
+    first_k = max(0, math.ceil(start / step - 0.5))
+    end_k = min(num_q, math.ceil(end / step - 0.5))
+    return max(0, end_k - first_k)
+
+
+def extract_pages(pdf_file):
+    reader = PyPDF2.PdfReader(pdf_file)
+    return len(reader.pages), iter_pages(reader)
+
+
+def build_plan(pdf_file, num_q, max_tokens=CHUNK_TOKENS, batch_size=generation.BATCH_SIZE):
+    # Generator of (question count, context) batches for GenerationJob. Being
+    # lazy, the first batches are already being generated while later pages
+    # are still being extracted. A PDF seen before is served from the page
+    # cache without being parsed again.
+    total_pages, pages = pdf_cache.cached_pages(pdf_file, extract_pages)
+    yield from plan_from_pages(pages, total_pages, num_q, max_tokens, batch_size)
+
+
+def plan_from_pages(pages, total_pages, num_q, max_tokens=CHUNK_TOKENS, batch_size=generation.BATCH_SIZE):
+    return pack_requests(chunk_quotas(pages, total_pages, num_q, max_tokens), batch_size)
+
+
+def chunk_quotas(pages, total_pages, num_q, max_tokens=CHUNK_TOKENS):
+    # (question count, text) for every chunk that received questions
+    leftover = 0
+    last_text = None
+    for start, end, text in iter_chunks(pages, max_tokens):
+        count = quota_for(start, end, num_q, total_pages)
+        if not text.strip():
+            # Scanned/blank pages: hand their questions to the next chunk with text
+            leftover += count
+            continue
+        count += leftover
+        leftover = 0
+        last_text = text
+        if count:
+            yield count, text
+    if leftover and last_text is not None:
+        yield leftover, last_text
+
+
+def pack_requests(quotas, batch_size=generation.BATCH_SIZE):
+    # Consecutive chunk quotas share a request of up to batch_size questions,
+    # so a long PDF with one question per chunk costs about num_q / batch_size
+    # model calls, not one per chunk. A quota larger than that is split.
+    parts, size = [], 0
+    for count, text in quotas:
+        while count:
+            take = min(count, batch_size - size)
+            if parts and parts[-1][1] is text:
+                parts[-1] = (parts[-1][0] + take, text)
+            else:
+                parts.append((take, text))
+            size += take
+            count -= take
+            if size == batch_size:
+                yield size, packed_context(parts)
+                parts, size = [], 0
+    if parts:
+        yield size, packed_context(parts)
+
+
+def packed_context(parts):
+    # One excerpt is sent as is; several are labelled with their share of the questions
+    if len(parts) == 1:
+        return parts[0][1]
+    return "\n\n".join(f"[Excerpt {i} of {len(parts)}: base {count} of the questions on this excerpt]\n{text}"
+                       for i, (count, text) in enumerate(parts, 1))
@@ -0,0 +1,130 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Opt-in instrumentation: set EXAM_PROFILE=1 to record timing spans around
+# script runs, render functions, callbacks, persistence and network calls.
+# When it is off, traced() returns the function unchanged and span() is a
+# shared no-op context, so production reruns pay nothing.
+#
+# Spans from every thread go into one bounded buffer. A script run takes the
+# spans recorded on its thread since the session's previous run ended, which
+# includes the widget callbacks Streamlit runs just before the script body;
+# spans on other threads (generation workers) are kept as background spans.
+# Runs export as JSON or as a Chrome trace (chrome://tracing, Perfetto).
+
+ENABLED = os.environ.get("EXAM_PROFILE", "") not in ("", "0")
+MAX_SPANS = 20000
+
+_spans = deque(maxlen=MAX_SPANS)  # (seq, name, start, duration, depth, thread id, thread name)
+_seq = itertools.count()
+_lock = threading.Lock()
+_local = threading.local()
+_NO_SPAN = nullcontext()
+_EPOCH = time.time() - time.perf_counter()
+
+
+@contextmanager
+def _span(name):
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _local.depth = depth
+        thread = threading.current_thread()
+        with _lock:
+            _spans.append((next(_seq), name, start, duration, depth, thread.ident, thread.name))
+
+
+def span(name):
+    return _span(name) if ENABLED else _NO_SPAN
+
+
+def traced(name=None):
+    # Decorator; a no-op unless profiling is enabled.
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class RunProfile:
+    __slots__ = ('since', 'started', 'ended', 'widgets', 'spans', 'background')
+
+    def __init__(self, since=None):
+        self.started = time.perf_counter()
+        self.since = self.started if since is None else since
+        self.ended = None
+        self.widgets = None
+        self.spans = []
+        self.background = []
+
+    def finish(self, widgets=None):
+        # Collects this thread's spans since `since` (so the callbacks that ran
+        # before the script body are included) and the other threads' spans
+        # that overlapped the run.
+        self.ended = time.perf_counter()
+        self.widgets = widgets
+        tid = threading.get_ident()
+        with _lock:
+            spans = list(_spans)
+        self.spans = sorted((s for s in spans if s[5] == tid and s[2] >= self.since), key=lambda s: s[2])
+        self.background = [s for s in spans if s[5] != tid and s[2] < self.ended and s[2] + s[3] > self.started]
+
+    @property
+    def duration(self):
+        return (self.ended or time.perf_counter()) - self.started
+
+    def to_dict(self):
+        def spans_dict(spans):
+            return [{"name": s[1], "start_ms": round((s[2] - self.started) * 1000, 3), "ms": round(s[3] * 1000, 3),
+                     "depth": s[4], "thread": s[6]} for s in spans]
+        return {
+            "started": round(_EPOCH + self.started, 3),
+            "ms": round(self.duration * 1000, 3),
+            "widgets": self.widgets,
+            "spans": spans_dict(self.spans),
+            "background": spans_dict(self.background),
+        }
+
+
+def begin_run(since=None):
+    # None when profiling is off. since: when the previous run of the same
+    # session ended, to pick up the callbacks of this one.
+    return RunProfile(since) if ENABLED else None
+
+
+def to_json(runs):
+    return json.dumps([run.to_dict() for run in runs], indent=2)
+
+
+def to_chrome_trace(runs):
+    # Trace Event Format: complete ("X") events in microseconds, plus a
+    # counter track for the widget count per run.
+    events, seen = [], set()
+    for run in runs:
+        for s in run.spans + run.background:
+            if s[0] in seen:
+                continue
+            seen.add(s[0])
+            events.append({"name": s[1], "ph": "X", "ts": round(s[2] * 1e6, 1), "dur": round(s[3] * 1e6, 1),
+                           "pid": 1, "tid": s[5], "args": {"thread": s[6]}})
+        if run.widgets is not None:
+            events.append({"name": "widgets", "ph": "C", "ts": round(run.started * 1e6, 1), "pid": 1,
+                           "args": {"widgets": run.widgets}})
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
@@ -1,15 +1,99 @@
 import streamlit as st
 import requests
+import hashlib
+import json
+import os
+import threading
+import time
 
 # Set page to wide mode for a better CBT feel
 st.set_page_config(layout="wide")
 
+CACHE_TTL = 300 # seconds before a topic set is revalidated with the server
+DISK_CACHE_DIR = ".gist_cache"
+FETCH_TIMEOUT = (5, 15)
+
+class GistFetcher:
+    # Topic sets are kept in memory for CACHE_TTL, then revalidated with
+    # If-None-Match so an unchanged gist costs a 304 instead of a download.
+    # The last good copy is also kept on disk and served when offline.
+    def __init__(self):
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.entries = {} # url -> (expires, etag, data)
+        self.url_locks = {} # one in-flight request per URL (prefetch vs. first click)
+
+    def _disk_path(self, url):
+        return os.path.join(DISK_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+
+    def _load_disk(self, url):
+        try:
+            with open(self._disk_path(url), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            return saved.get('etag'), saved.get('data')
+        except (OSError, ValueError):
+            return None, None
+
+    def _save_disk(self, url, etag, data):
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        path = self._disk_path(url)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'etag': etag, 'data': data}, f)
+        os.replace(path + ".tmp", path)
+
+    def fetch(self, url):
+        if not url or not url.startswith(('http://', 'https://')):
+            return None # e.g. the placeholder entries in URL_MAP
+        with self.lock:
+            url_lock = self.url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            return self._fetch_locked(url)
+
+    def _fetch_locked(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry and entry[0] > time.time():
+            return entry[2]
+        etag, data = (entry[1], entry[2]) if entry else self._load_disk(url)
+        headers = {'If-None-Match': etag} if etag and data is not None else {}
+        try:
+            response = self.session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+            if response.status_code == 304:
+                pass # unchanged: keep the copy we have
+            else:
+                response.raise_for_status()
+                data = response.json()
+                etag = response.headers.get('ETag')
+                self._save_disk(url, etag, data)
+        except (requests.RequestException, ValueError):
+            if data is None:
+                return None
+            # Offline or server error: serve the last good copy, retry soon
+        with self.lock:
+            self.entries[url] = (time.time() + CACHE_TTL, etag, data)
+        return data
+
+    def prefetch(self, urls):
+        for url in urls:
+            threading.Thread(target=self.fetch, args=(url,), daemon=True).start()
+
+@st.cache_resource
+def get_fetcher():
+    # One fetcher per server process, shared by every session and rerun
+    fetcher = GistFetcher()
+    fetcher.prefetch(URL_MAP.values())
+    return fetcher
+
 def fetch_data(url):
-    try:
-        response = requests.get(url)
-        return response.json()
-    except:
-        return None
+    return get_fetcher().fetch(url)
+
+# Define your Gist URLs here
+URL_MAP = {
+    "Systemic Sclerosis": "https://gist.githubusercontent.com/drpratap123singh-pixel/0c89646350ae70ae3dc4353fe9d38f15/raw/c8ad499c80db51cb6063ea09f0ffb7c5a900a3f0/ssc_quiz.json", 
+    "Immunology (SAD)": "YOUR_SECOND_GIST_URL_HERE"
+}
+
+get_fetcher() # Starts downloading every bank while the sidebar renders
 
 # --- SIDEBAR: THE QUESTION BANK MENU ---
 st.sidebar.title("📚 Question Bank")
@@ -18,12 +102,6 @@ quiz_choice = st.sidebar.radio(
     ["Home", "Systemic Sclerosis", "Immunology (SAD)", "General Medicine"]
 )
 
-# Define your Gist URLs here
-URL_MAP = {
-    "Systemic Sclerosis": "https://gist.githubusercontent.com/drpratap123singh-pixel/0c89646350ae70ae3dc4353fe9d38f15/raw/c8ad499c80db51cb6063ea09f0ffb7c5a900a3f0/ssc_quiz.json", 
-    "Immunology (SAD)": "YOUR_SECOND_GIST_URL_HERE"
-}
-
 if quiz_choice == "Home":
     st.title("👨‍⚕️ CBT Exam Simulator")
     st.write("Select a topic from the sidebar to begin your super-specialty practice.")
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import re
+
+# One normalized, immutable representation for every question the app sees:
+# question_bank.json, the local bank, AI output and pasted JSON all go through
+# Question.from_dict once, and grading/rendering work on the precomputed
+# option tuple and correct-option index instead of re-reading raw dicts.
+
+_LETTER_ANSWER = re.compile(r'^\(?([A-Za-z])[\).:]?$')
+_LETTER_PREFIX = re.compile(r'^\(?[A-Za-z][\).:]\s+')
+
+
+def _resolve_schema(q):
+    # Both supported schemas: options/correct_answer and answerOptions/isCorrect.
+    options = q.get('options')
+    correct = q.get('correct_answer')
+    rationale = q.get('rationale')
+    if isinstance(options, dict):
+        # {"A": "...", "B": "..."} style, answered by letter
+        options = list(options.values())
+    answer_options = q.get('answerOptions')
+    if answer_options is not None and not (isinstance(answer_options, list) and all(isinstance(o, dict) for o in answer_options)):
+        raise ValueError("answerOptions must be a list of objects")
+    if not options and answer_options:
+        options = [opt.get('text', '') for opt in answer_options]
+    if options and not isinstance(options, (list, tuple)):
+        raise ValueError("options must be a list or an object")
+    if not correct and answer_options:
+        for opt in answer_options:
+            if opt.get('isCorrect'):
+                correct = opt.get('text')
+                if opt.get('rationale'):
+                    rationale = opt.get('rationale')
+                break
+    return list(options or []), correct, rationale
+
+
+def _correct_index(options, correct):
+    if correct is None:
+        return None
+    options = [str(opt) for opt in options]
+    answer = str(correct).strip()
+    for i, opt in enumerate(options):
+        if opt == answer:
+            return i
+    # A number that is not an option's text is a 0-based index
+    if isinstance(correct, int) and not isinstance(correct, bool):
+        return correct if 0 <= correct < len(options) else None
+    correct = answer
+    # Model output often answers "B" or "B. text" instead of the exact option text
+    folded = _LETTER_PREFIX.sub('', correct).casefold()
+    for i, opt in enumerate(options):
+        if _LETTER_PREFIX.sub('', opt).casefold() == folded:
+            return i
+    letter = _LETTER_ANSWER.match(correct)
+    if letter:
+        i = ord(letter.group(1).upper()) - ord('A')
+        if i < len(options):
+            return i
+    return None
+
+
+def _text_field(value, name):
+    # Optional text fields: numbers become text, lists and objects are rejected
+    if value is None or value == '':
+        return None
+    if isinstance(value, (list, dict)):
+        raise ValueError(f"{name} must be text, got {type(value).__name__}")
+    return value if isinstance(value, str) else str(value)
+
+
+def content_id(text, options, correct_answer):
+    # Stable across runs and machines: only the text, options and answer count,
+    # so editing a rationale or category does not change a question's identity.
+    key = json.dumps([text, list(options), correct_answer], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+class Question:
+    __slots__ = ('id', 'text', 'options', 'correct_idx', 'rationale', 'hint', 'category')
+
+    def __init__(self, text, options, correct_idx, rationale=None, hint=None, category=None, qid=None):
+        options = tuple(str(opt) for opt in options)
+        correct_answer = options[correct_idx] if correct_idx is not None else None
+        set_ = object.__setattr__
+        set_(self, 'text', text)
+        set_(self, 'options', options)
+        set_(self, 'correct_idx', correct_idx)
+        set_(self, 'rationale', rationale)
+        set_(self, 'hint', hint)
+        set_(self, 'category', category)
+        set_(self, 'id', qid or content_id(text, options, correct_answer))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Question objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Question objects are immutable")
+
+    def __reduce__(self):
+        return (Question, (self.text, self.options, self.correct_idx, self.rationale, self.hint, self.category, self.id))
+
+    def __eq__(self, other):
+        return isinstance(other, Question) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Question({self.id!r}, {self.text[:40]!r})"
+
+    @property
+    def correct_answer(self):
+        return self.options[self.correct_idx] if self.correct_idx is not None else None
+
+    def is_correct(self, choice):
+        return choice is not None and choice == self.correct_idx
+
+    def replace(self, **fields):
+        values = {
+            'text': self.text, 'options': self.options, 'correct_idx': self.correct_idx,
+            'rationale': self.rationale, 'hint': self.hint, 'category': self.category, 'qid': self.id,
+        }
+        values.update(fields)
+        return Question(**values)
+
+    def to_dict(self):
+        # Canonical on-disk form (options/correct_answer schema)
+        d = {
+            "id": self.id,
+            "question": self.text,
+            "options": list(self.options),
+            "correct_answer": self.correct_answer,
+        }
+        for key, value in (("rationale", self.rationale), ("hint", self.hint), ("category", self.category)):
+            if value:
+                d[key] = value
+        return d
+
+    @classmethod
+    def from_dict(cls, raw, qid=None):
+        # Raises ValueError for anything that cannot be shown as an MCQ.
+        if isinstance(raw, Question):
+            return raw
+        if not isinstance(raw, dict):
+            raise ValueError(f"expected a question object, got {type(raw).__name__}")
+        text = raw.get('question')
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("missing question text")
+        options, correct, rationale = _resolve_schema(raw)
+        if len(options) < 2:
+            raise ValueError("a question needs at least two options")
+        return cls(
+            text, options, _correct_index(options, correct),
+            rationale=_text_field(rationale, 'rationale'),
+            hint=_text_field(raw.get('hint'), 'hint'),
+            category=_text_field(raw.get('category'), 'category'),
+            qid=qid,
+        )
+
+
+def parse_question(raw):
+    # Ingest check for new questions (pasted, generated, imported): stricter
+    # than from_dict, which also has to load what is already stored. Raises
+    # ValueError.
+    try:
+        q = Question.from_dict(raw)
+    except (TypeError, AttributeError) as e:
+        raise ValueError(f"malformed question: {e}")
+    if q.correct_idx is None:
+        raise ValueError("correct answer does not match any option")
+    return q
+
+
+def parse_questions(raws):
+    # Normalizes a batch, keeping the good ones and reporting the rest by position.
+    questions, errors = [], []
+    if isinstance(raws, dict):
+        raws = raws.get('questions', [raws])
+    if not isinstance(raws, list):
+        raise ValueError("expected a JSON array of questions")
+    for i, raw in enumerate(raws):
+        try:
+            questions.append(parse_question(raw))
+        except ValueError as e:
+            errors.append((i, str(e)))
+    return questions, errors
+
+
+def response_index(q, value):
+    # Responses are option indexes; records written before that store option text.
+    if value is None or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    try:
+        return q.options.index(value)
+    except ValueError:
+        return None
+
+
+MISSING_QUESTION = Question(
+    "This question is no longer available in the local question bank.",
+    (), None, qid="missing",
+)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import re
+import threading
+
+import storage
+from minhash import MinHashIndex
+from profiling import traced
+from question_model import MISSING_QUESTION, Question, parse_questions
+from search_index import SearchIndex
+
+# Interned question table. Every question is stored exactly once, keyed by a
+# hash of its content, in an append-only JSONL file. The bank and the exam
+# history both refer to questions by that ID instead of carrying copies.
+#
+# In memory the table keeps two indexes: normalized question (text, options
+# and answer) -> ID, so a re-pasted or regenerated question is merged into the
+# existing one in O(1) while another MCQ that shares only its stem is not,
+# and category -> IDs. Later lines for the same ID win on load, which lets a
+# merge persist as one appended line instead of a rewrite of the bank.
+#
+# Questions are immutable, so one store can be shared read-mostly by every
+# browser session in the process; writes take a lock.
+
+QUESTIONS_FILE = "local_qbank.jsonl"
+LEGACY_QBANK_FILE = "local_qbank.json"
+MIGRATE_BATCH = 500
+
+UNCATEGORIZED = "Uncategorized"
+MERGE_FIELDS = ('rationale', 'hint', 'category')
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def _normalize(text):
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def text_key(q):
+    # Case, whitespace and punctuation differences do not make a new question;
+    # different options or a different answer do.
+    parts = [_normalize(q.text), *(_normalize(opt) for opt in q.options), str(q.correct_idx)]
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def choice_key(q):
+    # Options (in any order) and answer; a reworded stem with the same choices
+    # is a near-duplicate, the same stem with other choices is not
+    answer = _normalize(q.correct_answer) if q.correct_answer is not None else None
+    return frozenset(_normalize(opt) for opt in q.options), answer
+
+
+class QuestionStore:
+    @traced("QuestionStore.load")
+    def __init__(self, filepath=QUESTIONS_FILE, legacy_path=LEGACY_QBANK_FILE):
+        self.filepath = filepath
+        self._by_id = {}
+        self._by_text = {}
+        self._by_category = {}
+        self._near = None # MinHash index over question text, built on first use
+        self._search = None # Full-text index, built on first search
+        self._lock = threading.RLock() # Guards writes and the lazy index builds
+        for raw in storage.iter_jsonl(filepath):
+            try:
+                self._index(Question.from_dict(raw, qid=raw.get('id')))
+            except ValueError:
+                continue
+        self._migrate_legacy(legacy_path)
+
+    def _index(self, q):
+        qid = q.id
+        old = self._by_id.get(qid)
+        if old is not None and old.category != q.category:
+            self._by_category.get(old.category or UNCATEGORIZED, {}).pop(qid, None)
+        self._by_id[qid] = q
+        self._by_text.setdefault(text_key(q), qid)
+        # Dicts as ordered sets: O(1) insert/remove, insertion order kept
+        self._by_category.setdefault(q.category or UNCATEGORIZED, {})[qid] = None
+        if self._near is not None:
+            self._near.add(qid, q.text)
+        if self._search is not None:
+            self._search.add(q)
+
+    def _migrate_legacy(self, legacy_path):
+        # Fold the old full-rewrite local_qbank.json into the table once.
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        # Streamed in batches; a rerun after a failure re-adds nothing twice.
+        batch = []
+        try:
+            for raw in storage.iter_legacy_json(legacy_path):
+                batch.append(raw)
+                if len(batch) >= MIGRATE_BATCH:
+                    self.add_many(parse_questions(batch)[0])
+                    batch = []
+            self.add_many(parse_questions(batch)[0])
+        except (OSError, ValueError):
+            return
+        os.replace(legacy_path, f"{legacy_path}.bak")
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, qid):
+        return qid in self._by_id
+
+    def get(self, qid):
+        return self._by_id.get(qid, MISSING_QUESTION)
+
+    def questions(self):
+        return list(self._by_id.values())
+
+    def categories(self):
+        return {cat: len(ids) for cat, ids in self._by_category.items() if ids}
+
+    def ids_in_category(self, category):
+        return list(self._by_category.get(category, ()))
+
+    def find_duplicate(self, q):
+        # ID of an already stored question with the same normalized text, options and answer, if any
+        if q.id in self._by_id:
+            return q.id
+        return self._by_text.get(text_key(q))
+
+    def near_duplicate(self, q):
+        # Stored question that is the same or nearly the same (MinHash over the
+        # stem's word shingles, with the same choices) as q, or None. Safe to call from generation worker threads.
+        qid = self.find_duplicate(q)
+        if qid is not None:
+            return qid
+        if self._near is None:
+            with self._lock:
+                if self._near is None:
+                    near = MinHashIndex()
+                    for stored in list(self._by_id.values()):
+                        near.add(stored.id, stored.text)
+                    self._near = near
+        choices = choice_key(q)
+        return self._near.find(q.text, accept=lambda qid: choice_key(self._by_id[qid]) == choices)
+
+    def is_known(self, q):
+        return self.near_duplicate(q) is not None
+
+    @traced("QuestionStore.search")
+    def search(self, query, limit=None):
+        # (IDs of the matching questions, best first; number of matches)
+        with self._lock:
+            if self._search is None:
+                index = SearchIndex()
+                for stored in self._by_id.values():
+                    index.add(stored)
+                self._search = index
+            return self._search.search(query, limit)
+
+    def resolve(self, ids):
+        return [self.get(qid) for qid in ids]
+
+    @traced("QuestionStore.add_many")
+    def add_many(self, questions):
+        # Takes normalized Question objects and returns the stored copy of each
+        # (in order). Only the delta is appended to disk: new questions, plus
+        # duplicates that filled in a field (rationale, hint, category) the
+        # stored copy was missing.
+        with self._lock:
+            return self._add_many(questions)
+
+    def _add_many(self, questions):
+        stored, changed = [], {}
+        for q in questions:
+            if q is MISSING_QUESTION:
+                stored.append(q)
+                continue
+            qid = self.find_duplicate(q)
+            if qid is None:
+                entry = q
+            else:
+                entry = self._by_id[qid]
+                missing = {f: getattr(q, f) for f in MERGE_FIELDS if getattr(q, f) and not getattr(entry, f)}
+                if missing:
+                    entry = entry.replace(**missing)
+            if entry is not self._by_id.get(entry.id):
+                self._index(entry)
+                changed[entry.id] = entry
+            stored.append(entry)
+        storage.append_jsonl((q.to_dict() for q in changed.values()), self.filepath)
+        return stored
+
+
+def record_questions(record, store):
+    # New records store question IDs; records written before that embed copies,
+    # which are interned here so the exam can refer to them by ID as well.
+    if 'question_ids' in record:
+        return store.resolve(record['question_ids'])
+    questions = []
+    for raw in record.get('questions', []):
+        try:
+            questions.append(Question.from_dict(raw))
+        except ValueError:
+            questions.append(MISSING_QUESTION)
+    return store.add_many(questions)
@@ -0,0 +1,135 @@
+import argparse
+import heapq
+import time
+
+import scoring
+from analytics import HistoryFold, iter_attempts, record_time
+from profiling import traced
+
+# SM-2 spaced repetition over the exam history. Every attempted question has
+# an easiness factor, a repetition count and an interval; each new attempt is
+# graded from its verdict and guess flag and pushes the question's due date
+# out (or back to tomorrow). Due dates live in a min-heap, so the next N due
+# questions cost O(N log n) instead of a scan of the bank.
+#
+# Persisted like the analytics (see analytics.HistoryFold): the new state of
+# the questions in each folded record is appended, then a records marker.
+#
+#   python scheduler.py --rebuild    # recompute every schedule from the history
+
+SCHEDULE_FILE = "local_schedule.jsonl"
+
+DAY = 24 * 60 * 60
+MIN_EASE = 1.3
+START_EASE = 2.5
+
+GRADE_SURE = 5      # correct, not flagged as a guess
+GRADE_GUESSED = 3   # correct, but a guess
+GRADE_WRONG = 1
+GRADE_SKIPPED = 0
+
+
+def grade(verdict, guessed):
+    if verdict == scoring.CORRECT:
+        return GRADE_GUESSED if guessed else GRADE_SURE
+    return GRADE_WRONG if verdict == scoring.WRONG else GRADE_SKIPPED
+
+
+class Card:
+    __slots__ = ('ease', 'reps', 'interval', 'due')
+
+    def __init__(self, ease=START_EASE, reps=0, interval=0, due=0.0):
+        self.ease = ease
+        self.reps = reps
+        self.interval = interval  # days
+        self.due = due
+
+    def review(self, g, seen_at):
+        if g >= 3:
+            if self.reps == 0:
+                self.interval = 1
+            elif self.reps == 1:
+                self.interval = 6
+            else:
+                self.interval = round(self.interval * self.ease)
+            self.reps += 1
+        else:
+            self.reps = 0
+            self.interval = 1
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - g) * (0.08 + (5 - g) * 0.02))
+        self.due = seen_at + self.interval * DAY
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{f: d[f] for f in cls.__slots__ if f in d})
+
+
+class Scheduler(HistoryFold):
+    def __init__(self, store, filepath=SCHEDULE_FILE, load=True):
+        super().__init__(store, filepath)
+        self._cards = self._load(load, Card.from_dict)
+        # (due, qid); entries whose due no longer matches the card are stale
+        self._heap = [(card.due, qid) for qid, card in self._cards.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def _fold(self, record, changed):
+        seen_at = record_time(record) or time.time()
+        for q, verdict, guessed in iter_attempts(record, self._store):
+            card = self._cards.get(q.id)
+            if card is None:
+                card = self._cards[q.id] = Card()
+            card.review(grade(verdict, guessed), seen_at)
+            heapq.heappush(self._heap, (card.due, q.id))
+            changed[q.id] = card
+
+    def _entries(self):
+        return self._cards
+
+    @traced("Scheduler.due")
+    def due(self, limit=None, now=None, accept=None):
+        # IDs of due questions, most overdue first. accept(qid) can narrow them
+        # down (e.g. to some categories). Stale heap entries are dropped on the way.
+        now = time.time() if now is None else now
+        picked, popped, seen = [], [], set()
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now and (limit is None or len(picked) < limit):
+                entry = heapq.heappop(heap)
+                due, qid = entry
+                card = self._cards.get(qid)
+                if card is None or card.due != due or qid in seen:
+                    continue
+                seen.add(qid)
+                popped.append(entry)
+                if accept is None or accept(qid):
+                    picked.append(qid)
+            for entry in popped:
+                heapq.heappush(heap, entry)
+        return picked
+
+
+def rebuild(store, history, filepath=SCHEDULE_FILE):
+    return Scheduler(store, filepath, load=False).rebuild(history)
+
+
+if __name__ == "__main__":
+    import history_store
+    import question_store
+
+    parser = argparse.ArgumentParser(description="Spaced-repetition schedule")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the schedule from the exam history")
+    args = parser.parse_args()
+    store = question_store.QuestionStore()
+    history = history_store.HistoryStore()
+    if args.rebuild:
+        scheduler = rebuild(store, history)
+    else:
+        scheduler = Scheduler(store)
+        scheduler.sync(history)
+    print(f"{len(scheduler)} questions scheduled, {len(scheduler.due())} due now")
@@ -0,0 +1,71 @@
+# Grades an exam in a single pass. The result is computed once at submit
+# (or once when an older record is opened) and then reused by every review
+# rerun, so review navigation does not re-grade the whole exam per click.
+
+from exam_session import ExamSession
+
+SKIPPED = 0
+CORRECT = 1
+WRONG = 2
+
+
+class ExamResult:
+    __slots__ = ('verdicts', 'correct', 'wrong', 'skipped', 'guessed', 'guessed_correct')
+
+    def __init__(self, verdicts, guessed=0, guessed_correct=0):
+        self.verdicts = bytearray(verdicts)
+        self.correct = self.verdicts.count(CORRECT)
+        self.wrong = self.verdicts.count(WRONG)
+        self.skipped = len(self.verdicts) - self.correct - self.wrong
+        self.guessed = guessed
+        self.guessed_correct = guessed_correct
+
+    @property
+    def total(self):
+        return len(self.verdicts)
+
+    def verdict(self, idx):
+        return self.verdicts[idx]
+
+    def to_dict(self):
+        # Verdicts as a digit string: one byte per question on disk too
+        return {
+            "verdicts": self.verdicts.translate(_TO_DIGITS).decode('ascii'),
+            "guessed": self.guessed,
+            "guessed_correct": self.guessed_correct,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        verdicts = d['verdicts'].encode('ascii').translate(_FROM_DIGITS)
+        return cls(verdicts, d.get('guessed', 0), d.get('guessed_correct', 0))
+
+
+_TO_DIGITS = bytes.maketrans(b'\x00\x01\x02', b'012')
+_FROM_DIGITS = bytes.maketrans(b'012', b'\x00\x01\x02')
+
+
+def score_exam(questions, exam):
+    # exam is an ExamSession (response/guess vectors)
+    verdicts = bytearray(len(questions))
+    guessed = guessed_correct = 0
+    for i, q in enumerate(questions):
+        ans = exam.response(i)
+        if ans is not None:
+            verdicts[i] = CORRECT if q.is_correct(ans) else WRONG
+        if exam.is_guess(i):
+            guessed += 1
+            if verdicts[i] == CORRECT:
+                guessed_correct += 1
+    return ExamResult(verdicts, guessed, guessed_correct)
+
+
+def record_result(record, questions, exam=None):
+    # The result stored at submit; records from before results were stored
+    # are graded here (exam defaults to the record's own responses).
+    result = ExamResult.from_dict(record['result']) if 'result' in record else None
+    if result is None or result.total != len(questions):
+        if exam is None:
+            exam = ExamSession.from_history(record, questions)
+        result = score_exam(questions, exam)
+    return result
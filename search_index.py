@@ -0,0 +1,105 @@
+import bisect
+import heapq
+import math
+import re
+from array import array
+
+# In-memory inverted index over the question bank: word -> the documents that
+# contain it, as a sorted array of document numbers plus a parallel array of
+# weights (which fields the word appears in). A query intersects the posting
+# lists of its words, rarest first, and ranks the matches by weight * IDF, so
+# its cost follows the matches, not the size of the bank.
+#
+# Questions are added one at a time as the bank grows. A question that is
+# re-added (a merge filled in its rationale, hint or category) gets a new
+# document number; its old postings are skipped from then on.
+
+FIELD_WEIGHTS = (('text', 4), ('options', 2), ('category', 2), ('hint', 1), ('rationale', 1))
+MAX_WEIGHT = 255
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were which with
+""".split())
+
+_WORD = re.compile(r'\w+')
+
+
+def _indexable(word):
+    return (len(word) > 1 or word.isdigit()) and word not in STOPWORDS
+
+
+def tokenize(text):
+    return [w for w in _WORD.findall(text.lower()) if _indexable(w)]
+
+
+def _fields(q):
+    for field, weight in FIELD_WEIGHTS:
+        value = getattr(q, field)
+        if not value:
+            continue
+        yield (" ".join(value) if field == 'options' else value), weight
+
+
+class SearchIndex:
+    def __init__(self):
+        self._ids = []  # document number -> question ID, None once superseded
+        self._docs = {}  # question ID -> current document number
+        self._postings = {}  # word -> array of document numbers, ascending
+        self._weights = {}  # word -> bytearray, parallel to the postings
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, q):
+        old = self._docs.get(q.id)
+        if old is not None:
+            self._ids[old] = None
+        doc = self._docs[q.id] = len(self._ids)
+        self._ids.append(q.id)
+        weights = {}
+        for text, weight in _fields(q):
+            for word in _WORD.findall(text.lower()):
+                weights[word] = weights.get(word, 0) + weight
+        for word, weight in weights.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                if not _indexable(word):
+                    continue
+                postings = self._postings[word] = array('I')
+                self._weights[word] = bytearray()
+            postings.append(doc)
+            self._weights[word].append(min(weight, MAX_WEIGHT))
+
+    def search(self, query, limit=None):
+        # (matching question IDs, best first and at most limit of them; total matches).
+        # Every word of the query has to match.
+        words = set(tokenize(query))
+        if not words or any(w not in self._postings for w in words):
+            return [], 0
+        n = len(self._ids)
+        words = sorted(words, key=lambda w: len(self._postings[w]))
+        first = words[0]
+        idf = math.log(1 + n / len(self._postings[first]))
+        scores = {doc: w * idf for doc, w in zip(self._postings[first], self._weights[first])}
+        for word in words[1:]:
+            postings, weights = self._postings[word], self._weights[word]
+            idf = math.log(1 + n / len(postings))
+            narrowed = {}
+            if len(scores) * 16 < len(postings):
+                # Few candidates left: binary search them in the long posting list
+                for doc, score in scores.items():
+                    i = bisect.bisect_left(postings, doc)
+                    if i < len(postings) and postings[i] == doc:
+                        narrowed[doc] = score + weights[i] * idf
+            else:
+                for doc, w in zip(postings, weights):
+                    score = scores.get(doc)
+                    if score is not None:
+                        narrowed[doc] = score + w * idf
+            scores = narrowed
+            if not scores:
+                return [], 0
+        ids = self._ids
+        live = [(score, -doc) for doc, score in scores.items() if ids[doc] is not None]
+        ranked = heapq.nlargest(limit, live) if limit is not None else sorted(live, reverse=True)
+        return [ids[-doc] for _, doc in ranked], len(live)
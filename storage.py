@@ -0,0 +1,136 @@
+import json
+import os
+
+from profiling import traced
+
+# Small JSON Lines helpers shared by the on-disk stores. Every store in this
+# app only ever appends to its file, so a write costs the size of the new
+# data, not the size of everything already saved.
+
+
+def _fsync_dir(path):
+    # Make a rename/create durable. Not every platform can open directories.
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+@traced("storage.atomic_write_lines")
+def atomic_write_lines(lines, filepath):
+    # Write to a temp file next to the target, then rename over it.
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+    _fsync_dir(filepath)
+
+
+def iter_jsonl(filepath):
+    # Stream objects in file order without reading the whole file.
+    if not os.path.exists(filepath):
+        return
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Torn write from a crash mid-append; the line was never committed.
+                continue
+
+
+@traced("storage.append_jsonl")
+def append_jsonl(objs, filepath):
+    # Append a batch of objects with a single write + fsync.
+    data = "".join(dumps(obj) + "\n" for obj in objs).encode('utf-8')
+    if not data:
+        return
+    fd = os.open(filepath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # If a previous append was torn, start the new data on a fresh line.
+        if os.fstat(fd).st_size > 0:
+            with open(filepath, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_DECODER = json.JSONDecoder()
+_READ_CHARS = 64 * 1024
+
+
+def iter_json_array(f):
+    # Streams the elements of a top-level JSON array from a text file object,
+    # holding at most one element plus one read block in memory.
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        # Reads at least as much as is already buffered, so an element larger
+        # than one block is re-parsed O(log size) times, not once per block.
+        nonlocal buf, pos, eof
+        chunk = f.read(max(_READ_CHARS, len(buf) - pos))
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("unexpected end of JSON array")
+            fill()
+            continue
+        if not started:
+            if buf[pos] != '[':
+                raise ValueError("expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            obj, end = _DECODER.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("malformed JSON array")
+            fill()
+            continue
+        if end == len(buf) and not eof:
+            # A number at the end of the block may continue in the next one
+            fill()
+            continue
+        pos = end
+        yield obj
+
+
+def iter_legacy_json(filepath):
+    # Old stores were a single JSON array rewritten on every save. Raises
+    # ValueError part-way through if the file turns out to be malformed.
+    with open(filepath, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(f)